@@ -1,12 +1,17 @@
 # app/api.py
 
 from pathlib import Path
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Union
 from dotenv import load_dotenv
-import uuid
+import anyio
+import orjson
+import os
 import logging
 
 # --- Windows Playwright fix: use Proactor loop for subprocess support ---
@@ -31,9 +36,41 @@ from app.data_model import (
     UserFeedback,
     RecommendationOutput,  # kept import; not used as response_model anymore
 )
-from app.supplement_engine import generate_supplement_plan, PlanningError
+from app.supplement_engine import generate_supplement_plan_async, stream_supplement_plan_async, PlanningError
+from app.user_profile_builder import build_user_profile
+from app.vision_utils import warm_vision_client
+from app.openai_utils import warm_openai_client, warm_async_openai_client
 
-app = FastAPI()
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (C) instead of the stdlib encoder."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # OCR, PDF rendering and LLM calls run in AnyIO's threadpool; its default
+    # cap of 40 threads throttles concurrent uploads, so raise it.
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = int(os.getenv("THREADPOOL_TOKENS", "100"))
+
+    # Open the Vision gRPC channel up front so the first upload doesn't pay for it
+    try:
+        await run_in_threadpool(warm_vision_client)
+    except Exception as e:
+        logger.warning(f"Vision client warm-up failed: {e}")
+
+    # Same for the OpenAI connection pools used by the planner
+    try:
+        await run_in_threadpool(warm_openai_client)
+        await warm_async_openai_client()
+    except Exception as e:
+        logger.warning(f"OpenAI client warm-up failed: {e}")
+    yield
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # -----------------------------
 # Middleware
@@ -116,64 +153,27 @@ class FrontendUserInput(BaseModel):
 # POST /recommend endpoint
 # -----------------------------
 @app.post("/recommend", response_model=dict)  # allow extended fields
-def recommend(user_input: FrontendUserInput):
+async def recommend(user_input: FrontendUserInput):
     try:
-        # --- Normalize gender flexibly ---
-        gender_raw = (user_input.biological_sex or "unspecified").strip().lower()
-        if gender_raw in ["f", "female", "woman", "girl"]:
-            gender = "female"
-        elif gender_raw in ["m", "male", "man", "boy"]:
-            gender = "male"
-        elif gender_raw in ["other", "non-binary", "nonbinary"]:
-            gender = "other"
-        else:
-            gender = "unspecified"
-
-        # Default age if missing
-        age = user_input.age or 35
-
-        # Merge pregnancy info into lifestyle
-        lifestyle = user_input.lifestyle or {}
-        if user_input.pregnancy:
-            lifestyle["pregnancy"] = user_input.pregnancy.lower()
-
-        # Split medications vs. conditions
-        conditions = []
-        medications = []
-        for item in user_input.medical_conditions or []:
-            if item.lower() in ["aspirin", "ibuprofen", "paracetamol", "acetaminophen"]:
-                medications.append(item)
-            else:
-                conditions.append(item)
-
         # Optional extended inputs from FE
-        household_data = user_input.household.dict() if user_input.household else {}
-        grocery_data = [item.dict() for item in user_input.processed_grocery_data or []]
-        blood_data = [item.dict() for item in user_input.processed_blood_data or []]
+        # The planner reads every ProcessedItem field, so groceries are dumped whole;
+        # the household is only checked for presence and never copied.
+        has_household = user_input.household is not None
+        grocery_data = [item.model_dump() for item in user_input.processed_grocery_data or []]
+        # Blood items aren't mapped into the profile yet; only their count is logged
+        blood_count = len(user_input.processed_blood_data or [])
 
         logger.info(
-            f"Received household={bool(household_data)}, "
-            f"groceries={len(grocery_data)}, blood_tests={len(blood_data)}"
+            f"Received household={has_household}, "
+            f"groceries={len(grocery_data)}, blood_tests={blood_count}"
         )
 
-        # Build internal user profile
-        user = UserProfile(
-            user_id=str(uuid.uuid4()),
-            age=age,
-            gender=gender,
-            symptoms=[],
-            lifestyle=lifestyle,
-            medical_conditions=conditions,
-            medical_history={},
-            medications=medications,
-            goals=user_input.health_priorities or [],
-            blood_tests=[],  # map blood_data into BloodTestResult later if/when needed
-            wearable_data=None,
-            feedback=None,
-        )
+        user = build_user_profile(user_input)
 
-        # Generate full plan via LLM planner, passing grocery context
-        out = generate_supplement_plan(
+        # Generate full plan via LLM planner, passing grocery context.
+        # The completion is awaited on the async client, so waiting on the
+        # model holds no threadpool worker.
+        out = await generate_supplement_plan_async(
             user,
             grocery_context=grocery_data,
             grocery_nutrients=None,  # optional: compute and pass if you later add nutrition totals
@@ -194,6 +194,48 @@ def recommend(user_input: FrontendUserInput):
         )
 
 
+# -----------------------------
+# POST /recommend/stream endpoint
+# -----------------------------
+@app.post("/recommend/stream")
+async def recommend_stream(user_input: FrontendUserInput):
+    """
+    Same input and final plan as /recommend, streamed as NDJSON so the client can
+    start rendering while the LLM is still generating. One JSON object per line:
+      {"type": "delta", "content": "..."}   raw LLM output, as it arrives
+      {"type": "recommendation", ...}       each supplement once it is complete
+      {"type": "plan", "plan": {...}}       final plan, same shape as /recommend
+      {"type": "error", "detail": "..."}    planning failed mid-stream
+    """
+    try:
+        user = build_user_profile(user_input)
+        grocery_data = [item.model_dump() for item in user_input.processed_grocery_data or []]
+    except Exception as e:
+        logger.error(f"Error in /recommend/stream endpoint: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail="Internal Server Error. Please check your input and try again.",
+        )
+
+    async def events():
+        plan = stream_supplement_plan_async(user, grocery_context=grocery_data, grocery_nutrients=None)
+        try:
+            async for event in plan:
+                yield orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
+        except PlanningError as e:
+            # Headers are already sent, so report the failure in-band
+            logger.error(f"LLM planning error: {e}")
+            yield orjson.dumps(
+                {
+                    "type": "error",
+                    "detail": "Supplement planning temporarily unavailable. Please try again later.",
+                },
+                option=orjson.OPT_APPEND_NEWLINE,
+            )
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 # -----------------------------
 # Other routers
 # -----------------------------
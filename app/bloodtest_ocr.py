@@ -1,91 +1,229 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from starlette.concurrency import run_in_threadpool
+from typing import Any, BinaryIO, Iterator, List, Optional
+import asyncio
+import datetime
+import hashlib
 import os
-import json
-import io
+import orjson
+import re
+import shutil
+import tempfile
 from google.cloud import vision
-from google.oauth2 import service_account
-from pdf2image import convert_from_bytes
-from app.llm_utils import parse_bloodtest_text
-import pandas as pd
+from app.llm_utils import parse_bloodtest_text_async
+from app.cache_utils import TTLCache
+from app.vision_utils import VISION_FILE_MAX_PAGES, annotate_pdf_inline, get_vision_client, pdf_page_count
 import logging
 
-router = APIRouter()
+# pdf2image and python-calamine are imported in the branches that use them, so
+# workers that never see a PDF/Excel upload don't pay for loading them.
 
-# Setup Google Vision client
-creds_json = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
-if creds_json:
-    creds_info = json.loads(creds_json)
-    credentials = service_account.Credentials.from_service_account_info(creds_info)
-else:
-    credentials = None
+router = APIRouter()
 
-client = vision.ImageAnnotatorClient(credentials=credentials)
 logger = logging.getLogger("uvicorn.error")
 
+# Vision accepts at most 16 images per batch_annotate_images request
+VISION_BATCH_SIZE = 16
+
+# 150 DPI is plenty for printed lab reports and uploads ~half the bytes of
+# 200 DPI; scans with tiny print that OCR poorly are re-rendered at 200 DPI.
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "150"))
+PDF_RETRY_DPI = 200
+PDF_MIN_OCR_TOKENS = 20
+
+# Short PDFs are sent to Vision as-is; keep the inline request well under its size limit
+VISION_INLINE_PDF_MAX_BYTES = 20 * 1024 * 1024
+
+# Plain decimal/scientific number once "," decimals are swapped for "."
+_NUMBER_RE = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+
+# Users often re-upload the same file; cache the parsed result by content hash
+# so a repeat skips rendering, OCR and the LLM call entirely.
+_RESULT_CACHE = TTLCache(
+    maxsize=int(os.getenv("BLOODTEST_CACHE_SIZE", "256")),
+    ttl=int(os.getenv("BLOODTEST_CACHE_TTL", "86400")),
+)
+
+
+def _hash_upload(upload: BinaryIO) -> str:
+    """Digest an uploaded file in chunks, then rewind it for the parsers."""
+    digest = hashlib.file_digest(upload, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+    upload.seek(0)
+    return digest
+
+
+def _ocr_pdf_inline(upload: BinaryIO) -> Optional[str]:
+    """OCR a small PDF without rendering it; None if it must go through pdf2image."""
+    upload.seek(0, os.SEEK_END)
+    too_big = upload.tell() > VISION_INLINE_PDF_MAX_BYTES
+    upload.seek(0)
+    if too_big:
+        return None
+    # Vision only annotates the first VISION_FILE_MAX_PAGES pages inline, so
+    # longer (or unreadable) files go straight to rendering rather than paying
+    # for an inline call whose result would be thrown away.
+    pages = pdf_page_count(upload)
+    if pages is None or pages > VISION_FILE_MAX_PAGES:
+        return None
+    page_texts = annotate_pdf_inline(upload.read())
+    if page_texts is None:
+        return None
+    return "".join(text + "\n" for text in page_texts)
+
+
+def _render_pdf_pages(upload: BinaryIO, dpi: int = PDF_RENDER_DPI) -> List[bytes]:
+    """Render PDF pages to JPEG with pdftocairo and return the encoded page bytes."""
+    from pdf2image import convert_from_path
+
+    upload.seek(0)
+    with tempfile.TemporaryDirectory() as output_folder:
+        # poppler needs a path; stream the upload to disk instead of into memory
+        pdf_path = os.path.join(output_folder, "upload.pdf")
+        with open(pdf_path, "wb") as f:
+            shutil.copyfileobj(upload, f)
+
+        paths = convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            fmt="jpeg",
+            jpegopt={"quality": 85, "optimize": True},
+            output_folder=output_folder,
+            paths_only=True,
+            thread_count=os.cpu_count() or 1,
+            use_pdftocairo=True,
+        )
+        pages = []
+        for path in paths:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+    return pages
+
+
+def _annotate_page_batch(pages: List[bytes]) -> List[str]:
+    """OCR a batch of encoded pages in a single Vision request."""
+    requests = [
+        {
+            "image": vision.Image(content=page),
+            "features": [{"type_": vision.Feature.Type.TEXT_DETECTION}],
+        }
+        for page in pages
+    ]
+    response = get_vision_client().batch_annotate_images(requests=requests)
+    return [
+        page.text_annotations[0].description if page.text_annotations else ""
+        for page in response.responses
+    ]
+
+
+async def _ocr_pdf_pages(pages: List[bytes]) -> str:
+    """OCR all pages concurrently (batched per Vision request), keeping page order."""
+    batches = [pages[i:i + VISION_BATCH_SIZE] for i in range(0, len(pages), VISION_BATCH_SIZE)]
+    results = await asyncio.gather(*(run_in_threadpool(_annotate_page_batch, b) for b in batches))
+    return "".join(text + "\n" for batch in results for text in batch)
+
+
+def _cell_to_str(value: Any) -> str:
+    """Stringify a calamine cell the way pandas' string dtype did (140.0 -> "140")."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    return str(value)
+
+
+def _sheet_to_records(rows: Iterator[list]) -> Iterator[dict]:
+    """
+    Flatten a lab sheet (one row per date, one column per marker) into
+    {date, marker, value} records, keeping only cells that parse as numbers.
+    """
+    header = next(rows, None)
+    if header is None:
+        return
+    markers = [_cell_to_str(h) if h != "" else f"Unnamed: {i}" for i, h in enumerate(header)]
+    date_idx = markers.index("Datum") if "Datum" in markers else None
+
+    for row in rows:
+        date = _cell_to_str(row[date_idx]) if date_idx is not None else ""
+        for i, cell in enumerate(row):
+            if i == date_idx:
+                continue
+            if isinstance(cell, str):
+                if not _NUMBER_RE.fullmatch(cell.strip().replace(",", ".")):
+                    continue
+                value = cell
+            elif isinstance(cell, (int, float)) and not isinstance(cell, bool):
+                value = _cell_to_str(cell)
+            else:
+                continue
+            yield {"date": date, "marker": markers[i], "value": value}
+
+
+def _excel_to_text(upload: BinaryIO) -> str:
+    """Parse every sheet of an Excel export into a JSON list of marker records."""
+    from python_calamine import CalamineWorkbook
+
+    # Stream rows straight out of calamine (Rust) instead of building a pandas
+    # DataFrame per sheet only to melt it back into records.
+    workbook = CalamineWorkbook.from_filelike(upload)
+    processed_records = []
+
+    for name in workbook.sheet_names:
+        rows = workbook.get_sheet_by_name(name).iter_rows()
+        processed_records.extend(_sheet_to_records(rows))
+
+    return orjson.dumps(processed_records, option=orjson.OPT_INDENT_2).decode()
+
+
+def _ocr_image(upload: BinaryIO) -> str:
+    """OCR a single uploaded image with Vision."""
+    image_vision = vision.Image(content=upload.read())
+    response = get_vision_client().text_detection(image=image_vision)
+    return response.text_annotations[0].description if response.text_annotations else ""
+
+
 @router.post("/process-bloodtest")
 async def process_bloodtest(file: UploadFile = File(...)):
-    content = await file.read()
     file_ext = file.filename.split(".")[-1].lower()
 
+    # Starlette already spools the upload to a SpooledTemporaryFile (disk-backed
+    # once large), so hand that file to the parsers instead of reading it all
+    # into memory with `await file.read()`.
+    upload = file.file
+    digest = await run_in_threadpool(_hash_upload, upload)
+    cache_key = f"{file_ext}:{digest}"
+    cached = _RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        return orjson.loads(cached)
+
     try:
+        # Parsing, rendering and Vision/LLM calls all block, so they run in the
+        # threadpool and keep the event loop free for other requests.
         if file_ext in ["xlsx", "xls"]:
             try:
-                xls = pd.ExcelFile(io.BytesIO(content))
-                processed_records = []
-
-                for sheet_name in xls.sheet_names:
-                    df = xls.parse(sheet_name=sheet_name, dtype=str)
-                    df = df.fillna("")
-
-                    for _, row in df.iterrows():
-                        date = row.get("Datum", "")
-
-                        for col in df.columns:
-                            if col == "Datum":
-                                continue
-                            value = row[col]
-                            if not value.strip():
-                                continue
-                            try:
-                                float_val = float(value.replace(",", "."))
-                            except ValueError:
-                                continue
-
-                            marker_entry = {
-                                "date": date,
-                                "marker": col,
-                                "value": value
-                            }
-                            processed_records.append(marker_entry)
-
-                raw_text = json.dumps(processed_records, indent=2)
-
+                raw_text = await run_in_threadpool(_excel_to_text, upload)
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Failed to parse Excel file: {str(e)}")
 
         elif file_ext == "pdf":
-            images = convert_from_bytes(content)
-            full_text = ""
-            for image in images:
-                img_byte_arr = io.BytesIO()
-                image.save(img_byte_arr, format='PNG')
-                img_content = img_byte_arr.getvalue()
-                image_vision = vision.Image(content=img_content)
-                response = client.text_detection(image=image_vision)
-                text = response.text_annotations[0].description if response.text_annotations else ""
-                full_text += text + "\n"
-            raw_text = full_text
+            # Lab reports are usually a few pages: let Vision read the PDF directly
+            raw_text = await run_in_threadpool(_ocr_pdf_inline, upload)
+            if raw_text is None:
+                pages = await run_in_threadpool(_render_pdf_pages, upload)
+                raw_text = await _ocr_pdf_pages(pages)
+                if len(raw_text.split()) < PDF_MIN_OCR_TOKENS and PDF_RENDER_DPI < PDF_RETRY_DPI:
+                    pages = await run_in_threadpool(_render_pdf_pages, upload, PDF_RETRY_DPI)
+                    raw_text = await _ocr_pdf_pages(pages)
 
         else:
-            image_vision = vision.Image(content=content)
-            response = client.text_detection(image=image_vision)
-            raw_text = response.text_annotations[0].description if response.text_annotations else ""
+            raw_text = await run_in_threadpool(_ocr_image, upload)
 
         if not raw_text.strip():
             raise HTTPException(status_code=400, detail="No text detected in the blood test file.")
 
         # ✅ FIX: Don't wrap parse_bloodtest_text again
-        return parse_bloodtest_text(raw_text)
+        result = await parse_bloodtest_text_async(raw_text)
+        _RESULT_CACHE.set(cache_key, orjson.dumps(result))
+        return result
 
     except Exception as e:
         logger.error(f"Error processing blood test: {e}", exc_info=True)
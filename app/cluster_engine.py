@@ -1,12 +1,12 @@
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import numpy as np
-from sklearn.cluster import KMeans
-import json
+from sklearn.cluster import KMeans, MiniBatchKMeans
+import orjson
 import os
 from collections import Counter
 from app.data_model import UserProfile, SupplementRecommendation
-from app.symptom_scorer import score_nutrient_needs
+from app.symptom_scorer import ALL_NUTRIENTS, score_nutrient_needs_vec
 from app.dosage_calculator import determine_dosage
 from app.explanation_utils import build_explanation  # <-- Added import here
 
@@ -21,16 +21,41 @@ LIFESTYLE_VOCAB = sorted([
 
 GENDER_VOCAB = ["male", "female", "other"]
 CLUSTER_PROTOCOLS_FILE = Path(__file__).parent / "cluster_protocols.json"
+# Above this many users, fit with MiniBatchKMeans instead of full Lloyd iterations
+MINIBATCH_MIN_USERS = 10_000
+
+# Vector layout: [age, gender one-hot, symptom flags, lifestyle flags]. Token ->
+# column maps let vectorize_user set only the active columns instead of
+# scanning every vocab for every user.
+_GENDER_IDX = {g: 1 + i for i, g in enumerate(GENDER_VOCAB)}
+_SYMPTOM_IDX = {s: 1 + len(GENDER_VOCAB) + i for i, s in enumerate(SYMPTOM_VOCAB)}
+_LIFESTYLE_IDX = {l: 1 + len(GENDER_VOCAB) + len(SYMPTOM_VOCAB) + i for i, l in enumerate(LIFESTYLE_VOCAB)}
+VECTOR_DIM = 1 + len(GENDER_VOCAB) + len(SYMPTOM_VOCAB) + len(LIFESTYLE_VOCAB)
+# float32 halves the memory traffic of KMeans iterations; sklearn requires
+# predict() input to match the dtype the model was fitted on.
+VECTOR_DTYPE = np.float32
 
 def vectorize_user(user: UserProfile) -> np.ndarray:
     """
     Convert a UserProfile into a numeric vector for clustering.
     Age normalized to 0-1, one-hot encode gender, binary symptoms and lifestyle.
     """
-    age_norm = (user.age or 0) / 100.0
-    gender_vec = [1 if user.gender == g else 0 for g in GENDER_VOCAB]
-    symptoms_lower = set(s.lower() for s in user.symptoms or [])
-    symptom_vec = [1 if s in symptoms_lower else 0 for s in SYMPTOM_VOCAB]
+    vec = np.zeros(VECTOR_DIM, dtype=VECTOR_DTYPE)
+    _fill_user_vector(vec, user)
+    return vec
+
+def _fill_user_vector(vec: np.ndarray, user: UserProfile) -> None:
+    """Write a user's features into a zeroed row of length VECTOR_DIM, in place."""
+    vec[0] = (user.age or 0) / 100.0
+
+    idx = _GENDER_IDX.get(user.gender)
+    if idx is not None:
+        vec[idx] = 1.0
+
+    for s in user.symptoms or []:
+        idx = _SYMPTOM_IDX.get(s.lower())
+        if idx is not None:
+            vec[idx] = 1.0
 
     # Normalize lifestyle: support dict or list
     lifestyle_keys = []
@@ -38,9 +63,10 @@ def vectorize_user(user: UserProfile) -> np.ndarray:
         lifestyle_keys = [k.lower() for k, v in user.lifestyle.items() if v]
     elif isinstance(user.lifestyle, list):
         lifestyle_keys = [str(l).lower() for l in user.lifestyle]
-    lifestyle_vec = [1 if l in lifestyle_keys else 0 for l in LIFESTYLE_VOCAB]
-
-    return np.array([age_norm] + gender_vec + symptom_vec + lifestyle_vec, dtype=float)
+    for l in lifestyle_keys:
+        idx = _LIFESTYLE_IDX.get(l)
+        if idx is not None:
+            vec[idx] = 1.0
 
 
 class ClusterEngine:
@@ -49,35 +75,42 @@ class ClusterEngine:
         Initialize ClusterEngine with the number of clusters and random state.
         """
         self.n_clusters = n_clusters
-        self.model: Optional[KMeans] = None
+        self.model: Optional[Union[KMeans, MiniBatchKMeans]] = None
         self.fitted = False
         self.protocols: Dict[int, List[SupplementRecommendation]] = self._load_protocols()
         self.random_state = random_state
         self.all_users: List[UserProfile] = []
         self.user_vectors: Optional[np.ndarray] = None
+        self.labels: List[int] = []  # cluster of each user passed to fit(), in order
 
-    def fit(self, users: List[UserProfile]) -> None:
+    def fit(self, users: List[UserProfile]) -> Dict[int, List[SupplementRecommendation]]:
         """
         Fit KMeans model to user vectors and generate cluster protocols.
+        Returns the new protocols (also saved to disk) so callers can diff them
+        without re-reading the file.
         """
         if not users:
             print("[Warning] No users provided for clustering.")
-            return
+            return self.protocols
 
         self.all_users = users
-        X = np.array([vectorize_user(u) for u in users])
+        # Fill one preallocated (N, D) matrix instead of stacking per-user arrays
+        X = np.zeros((len(users), VECTOR_DIM), dtype=VECTOR_DTYPE)
+        for i, u in enumerate(users):
+            _fill_user_vector(X[i], u)
         self.user_vectors = X
-        self.model = KMeans(n_clusters=self.n_clusters, random_state=self.random_state)
+        if len(users) >= MINIBATCH_MIN_USERS:
+            self.model = MiniBatchKMeans(n_clusters=self.n_clusters, random_state=self.random_state)
+        else:
+            self.model = KMeans(n_clusters=self.n_clusters, random_state=self.random_state)
         self.model.fit(X)
         self.fitted = True
 
+        # fit() already labelled every training row; no need to re-predict each user
+        self.labels = self.model.labels_.tolist()
         cluster_to_users: Dict[int, List[UserProfile]] = {i: [] for i in range(self.n_clusters)}
-        for user in users:
-            try:
-                cluster_id = self.assign_cluster(user)
-                cluster_to_users[cluster_id].append(user)
-            except RuntimeError as e:
-                print(f"[Warning] Could not assign cluster for user {user.user_id}: {e}")
+        for label, user in zip(self.labels, users):
+            cluster_to_users[label].append(user)
 
         self.protocols = {
             cluster_id: generate_cluster_protocol(users_in_cluster)
@@ -85,6 +118,7 @@ class ClusterEngine:
         }
 
         self._save_protocols()
+        return self.protocols
 
     def assign_cluster(self, user: UserProfile) -> int:
         """
@@ -102,10 +136,9 @@ class ClusterEngine:
         """
         if not self.fitted or self.model is None:
             raise RuntimeError("ClusterEngine not fitted yet")
-        vec = vectorize_user(user)
-        cluster_idx = self.assign_cluster(user)
-        centroid = self.model.cluster_centers_[cluster_idx]
-        return np.linalg.norm(vec - centroid)
+        # The assigned cluster is the nearest centroid, so one vectorised distance
+        # pass answers both questions without a separate predict()
+        return min(self.distance_to_all_centroids(user))
 
     def distance_to_all_centroids(self, user: UserProfile) -> List[float]:
         """
@@ -114,7 +147,7 @@ class ClusterEngine:
         if not self.fitted or self.model is None:
             raise RuntimeError("ClusterEngine not fitted yet")
         vec = vectorize_user(user)
-        return [np.linalg.norm(vec - centroid) for centroid in self.model.cluster_centers_]
+        return np.linalg.norm(self.model.cluster_centers_ - vec, axis=1).tolist()
 
     def get_cluster_centroids(self) -> np.ndarray:
         """
@@ -134,13 +167,20 @@ class ClusterEngine:
 
     def _save_protocols(self) -> None:
         """
-        Save current cluster protocols to JSON file.
+        Save current cluster protocols to JSON file, unless they are unchanged.
         """
-        with open(CLUSTER_PROTOCOLS_FILE, "w") as f:
-            json.dump({
-                str(k): [rec.dict() if hasattr(rec, "dict") else rec.__dict__ for rec in v]
-                for k, v in self.protocols.items()
-            }, f, indent=2)
+        # orjson serializes the SupplementRecommendation dataclasses natively
+        serialized = orjson.dumps(
+            {str(k): v for k, v in self.protocols.items()},
+            option=orjson.OPT_INDENT_2,
+        )
+        # Re-clustering the same users usually reproduces the same protocols;
+        # comparing raw text is cheaper than rewriting and can't go stale like a
+        # stored hash could.
+        if CLUSTER_PROTOCOLS_FILE.exists() and CLUSTER_PROTOCOLS_FILE.read_bytes() == serialized:
+            print("[Debug] Cluster protocols unchanged; skipped save.")
+            return
+        CLUSTER_PROTOCOLS_FILE.write_bytes(serialized)
         print(f"[Debug] Saved cluster protocols to {CLUSTER_PROTOCOLS_FILE}")
 
     def _load_protocols(self) -> Dict[int, List[SupplementRecommendation]]:
@@ -150,8 +190,7 @@ class ClusterEngine:
         if not os.path.exists(CLUSTER_PROTOCOLS_FILE):
             print("[Debug] Cluster protocols file not found.")
             return {}
-        with open(CLUSTER_PROTOCOLS_FILE, "r") as f:
-            raw = json.load(f)
+        raw = orjson.loads(CLUSTER_PROTOCOLS_FILE.read_bytes())
         print(f"[Debug] Loaded cluster protocols from {CLUSTER_PROTOCOLS_FILE}")
         return {
             int(k): [SupplementRecommendation(**rec) for rec in v]
@@ -166,18 +205,16 @@ def generate_cluster_protocol(users_in_cluster: List[UserProfile]) -> List[Suppl
     Aggregates nutrient need scores across users, computes average scores,
     and generates dosages based on a representative dummy user.
     """
-    aggregate_scores = {}
-
-    for user in users_in_cluster:
-        scores = score_nutrient_needs(user)
-        for nutrient, score in scores.items():
-            aggregate_scores[nutrient] = aggregate_scores.get(nutrient, 0.0) + score
-
     n_users = len(users_in_cluster)
     if n_users == 0:
         return []
 
-    avg_scores = {nutrient: total / n_users for nutrient, total in aggregate_scores.items()}
+    # Sum per-user score vectors in one contiguous buffer instead of dict updates
+    aggregate_scores = np.zeros(len(ALL_NUTRIENTS))
+    for user in users_in_cluster:
+        aggregate_scores += score_nutrient_needs_vec(user)
+
+    avg_scores = dict(zip(ALL_NUTRIENTS, (aggregate_scores / n_users).tolist()))
 
     ages = [u.age for u in users_in_cluster if u.age is not None]
     median_age = int(np.median(ages)) if ages else 40
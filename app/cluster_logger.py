@@ -1,34 +1,40 @@
 # cluster_logger.py
 
 from pathlib import Path
-import json
+import orjson
 import os
 from datetime import datetime, timezone
-from typing import List, Dict
+from typing import Any, Iterable, List, Dict
 from app.data_model import UserProfile, SupplementRecommendation
 
 # Base directory where this script resides
 BASE_DIR = Path(__file__).parent
 
-# Relative paths resolved from this script's location
-CLUSTER_HISTORY_FILE = BASE_DIR / "cluster_history.json"
-PROTOCOL_CHANGE_LOG_FILE = BASE_DIR / "protocol_change_log.json"
+# Relative paths resolved from this script's location.
+# Logs are JSON Lines (one entry per line) so logging appends instead of
+# re-reading and rewriting the whole history on every run.
+CLUSTER_HISTORY_FILE = BASE_DIR / "cluster_history.jsonl"
+PROTOCOL_CHANGE_LOG_FILE = BASE_DIR / "protocol_change_log.jsonl"
+
+def _append_jsonl(path: Path, entries: Iterable[Dict[str, Any]]) -> None:
+    """Append entries to a JSON Lines file in a single write."""
+    with open(path, "ab") as f:
+        f.write(b"".join(orjson.dumps(e, option=orjson.OPT_APPEND_NEWLINE) for e in entries))
+
+def read_jsonl(path: Path) -> List[Dict[str, Any]]:
+    """Read every entry of a JSON Lines log; missing file means empty log."""
+    if not path.exists():
+        return []
+    with open(path, "rb") as f:
+        return [orjson.loads(line) for line in f if line.strip()]
 
 def log_cluster_assignments(users: List[UserProfile]) -> None:
     """Append timestamped user cluster assignments to log."""
-    history = []
-    if CLUSTER_HISTORY_FILE.exists():
-        with open(CLUSTER_HISTORY_FILE, "r") as f:
-            history = json.load(f)
-
     snapshot = {
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "assignments": {u.user_id: u.cluster_id for u in users}
     }
-    history.append(snapshot)
-
-    with open(CLUSTER_HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=2)
+    _append_jsonl(CLUSTER_HISTORY_FILE, [snapshot])
 
 def log_protocol_differences(old: Dict[int, List[SupplementRecommendation]],
                              new: Dict[int, List[SupplementRecommendation]]) -> None:
@@ -46,15 +52,19 @@ def log_protocol_differences(old: Dict[int, List[SupplementRecommendation]],
         old_dict = {r.name: rec_to_dict(r) for r in old_recs}
         new_dict = {r.name: rec_to_dict(r) for r in new_recs}
 
-        added = [v for k, v in new_dict.items() if k not in old_dict]
-        removed = [v for k, v in old_dict.items() if k not in new_dict]
+        # Key-view set algebra runs in C; iterate the dicts (not the sets) to keep
+        # entries in protocol order.
+        common = new_dict.keys() & old_dict.keys()
+        added = [v for k, v in new_dict.items() if k not in common]
+        removed = [v for k, v in old_dict.items() if k not in common]
         modified = [
             {
                 "name": k,
-                "old": old_dict[k],
-                "new": new_dict[k]
+                "old": old_v,
+                "new": new_v
             }
-            for k in new_dict if k in old_dict and new_dict[k] != old_dict[k]
+            for k, new_v in new_dict.items()
+            if k in common and new_v != (old_v := old_dict[k])
         ]
 
         if added or removed or modified:
@@ -67,11 +77,4 @@ def log_protocol_differences(old: Dict[int, List[SupplementRecommendation]],
             })
 
     if changes:
-        log = []
-        if PROTOCOL_CHANGE_LOG_FILE.exists():
-            with open(PROTOCOL_CHANGE_LOG_FILE, "r") as f:
-                log = json.load(f)
-
-        log.extend(changes)
-        with open(PROTOCOL_CHANGE_LOG_FILE, "w") as f:
-            json.dump(log, f, indent=2)
\ No newline at end of file
+        _append_jsonl(PROTOCOL_CHANGE_LOG_FILE, changes)
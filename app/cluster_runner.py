@@ -1,7 +1,7 @@
 from pathlib import Path
 # cluster_runner.py
 
-import json
+import orjson
 import os
 from app.data_storage import load_all_users, save_all_users
 from app.cluster_engine import ClusterEngine
@@ -12,8 +12,8 @@ CLUSTER_PROTOCOLS_FILE = Path(__file__).parent / "cluster_protocols.json"
 
 def load_old_protocols():
     if os.path.exists(CLUSTER_PROTOCOLS_FILE):
-        with open(CLUSTER_PROTOCOLS_FILE, "r") as f:
-            raw = json.load(f)
+        with open(CLUSTER_PROTOCOLS_FILE, "rb") as f:
+            raw = orjson.loads(f.read())
             return {
                 int(cid): [
                     SupplementRecommendation(
@@ -37,22 +37,19 @@ def run_clustering():
         print("No users to cluster.")
         return
 
-    # Load old protocols from file
-    old_protocols = load_old_protocols()
-
-    # Fit and assign with updated engine
+    # The engine loads the saved (old) protocols on init; fit() returns the new ones
     cluster_engine = ClusterEngine(n_clusters=5)
-    cluster_engine.fit(users)
+    old_protocols = cluster_engine.protocols
+    new_protocols = cluster_engine.fit(users)
 
-    for user in users:
-        cluster = cluster_engine.assign_cluster(user)
+    # Training users are already labelled by fit(); don't re-vectorise and re-predict
+    for user, cluster in zip(users, cluster_engine.labels):
         user.cluster_id = cluster
 
     save_all_users(users)
 
     # Log new assignments and any protocol differences
     log_cluster_assignments(users)
-    new_protocols = load_old_protocols()  # Load updated protocols
     log_protocol_differences(old_protocols, new_protocols)
 
     print(f"âœ… Assigned clusters for {len(users)} users and logged protocol changes.")
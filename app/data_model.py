@@ -6,13 +6,13 @@ from typing import List, Dict, Optional, Union
 
 # --- Supplement and Health Models ---
 
-@dataclass
+@dataclass(slots=True)
 class BloodTestResult:
     marker: str         # Name of the blood marker, e.g., 'Vitamin D'
     value: float        # Numeric value of the test result
     unit: str           # Unit of measurement, e.g., 'ng/mL'
 
-@dataclass
+@dataclass(slots=True)
 class WearableMetrics:
     sleep_hours: Optional[float] = None
     hrv: Optional[float] = None
@@ -22,7 +22,7 @@ class WearableMetrics:
     spo2: Optional[float] = None
     sunlight_exposure_minutes: Optional[int] = None
 
-@dataclass
+@dataclass(slots=True)
 class UserFeedback:
     mood: Optional[str] = None
     energy: Optional[str] = None
@@ -65,7 +65,7 @@ class UserProfile:
     feedback: Optional[UserFeedback] = None
     cluster_id: Optional[int] = None
 
-    symptom_history: Optional[Dict[str, List[Dict[str, str]]]] = field(default_factory=dict)
+    symptom_history: Dict[str, List[Dict[str, str]]] = field(default_factory=dict)
 
     dose_response_log: List[DoseResponseEntry] = field(default_factory=list)
 
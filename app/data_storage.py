@@ -1,15 +1,26 @@
 from pathlib import Path
-import json
-from typing import List
+from dataclasses import fields
+from operator import attrgetter
+import orjson
+from typing import Dict, List, Optional
 from app.data_model import UserProfile, BloodTestResult, WearableMetrics, UserFeedback
 import os
 
-USERS_FILE = Path(__file__).parent / "users.json"
+USERS_FILE = Path(__file__).parent / "users.jsonl"
+
+# Field order for the nested dataclasses (slots=True, so there is no
+# __dict__ to hand out); one attrgetter call pulls every field in C.
+_BT_FIELDS = tuple(f.name for f in fields(BloodTestResult))
+_WEARABLE_FIELDS = tuple(f.name for f in fields(WearableMetrics))
+_FEEDBACK_FIELDS = tuple(f.name for f in fields(UserFeedback))
+_get_bt = attrgetter(*_BT_FIELDS)
+_get_wearable = attrgetter(*_WEARABLE_FIELDS)
+_get_feedback = attrgetter(*_FEEDBACK_FIELDS)
 
 def blood_tests_to_list(blood_tests: List[BloodTestResult]) -> List[dict]:
     if not blood_tests:
         return []
-    return [bt.__dict__ for bt in blood_tests]
+    return [dict(zip(_BT_FIELDS, _get_bt(bt))) for bt in blood_tests]
 
 def list_to_blood_tests(blood_tests_list: List[dict]) -> List[BloodTestResult]:
     if not blood_tests_list:
@@ -19,7 +30,7 @@ def list_to_blood_tests(blood_tests_list: List[dict]) -> List[BloodTestResult]:
 def wearable_to_dict(wearable: WearableMetrics) -> dict:
     if not wearable:
         return None
-    return wearable.__dict__
+    return dict(zip(_WEARABLE_FIELDS, _get_wearable(wearable)))
 
 def dict_to_wearable(data: dict) -> WearableMetrics:
     if not data:
@@ -29,75 +40,107 @@ def dict_to_wearable(data: dict) -> WearableMetrics:
 def feedback_to_dict(feedback: UserFeedback) -> dict:
     if not feedback:
         return {}
-    return feedback.__dict__
+    return dict(zip(_FEEDBACK_FIELDS, _get_feedback(feedback)))
 
 def dict_to_feedback(data: dict) -> UserFeedback:
     if not data:
         return None
     return UserFeedback(**data)
 
+# Persisted UserProfile fields that need no conversion; the nested
+# blood_tests / wearable_data / feedback are handled explicitly below.
+_PLAIN_FIELDS = (
+    "user_id", "age", "gender", "symptoms", "medical_conditions",
+    "lifestyle", "medical_history", "goals", "medications", "cluster_id",
+    "weight_kg", "height_cm", "diet_type", "location",
+)
+_REQUIRED_FIELDS = ("user_id", "age", "gender")
+_get_plain = attrgetter(*_PLAIN_FIELDS)
+
 def user_to_dict(user: UserProfile) -> dict:
-    return {
-        "user_id": user.user_id,
-        "age": user.age,
-        "gender": user.gender,
-        "symptoms": user.symptoms,
-        "medical_conditions": user.medical_conditions,
-        "blood_tests": blood_tests_to_list(user.blood_tests),
-        "wearable_data": wearable_to_dict(user.wearable_data),
-        "feedback": feedback_to_dict(user.feedback),
-        "lifestyle": user.lifestyle,
-        "medical_history": user.medical_history,
-        "goals": user.goals,
-        "medications": user.medications,
-        "cluster_id": user.cluster_id,
-        "weight_kg": user.weight_kg,
-        "height_cm": user.height_cm,
-        "diet_type": user.diet_type,
-        "location": user.location
-    }
+    d = dict(zip(_PLAIN_FIELDS, _get_plain(user)))
+    d["blood_tests"] = blood_tests_to_list(user.blood_tests)
+    d["wearable_data"] = wearable_to_dict(user.wearable_data)
+    d["feedback"] = feedback_to_dict(user.feedback)
+    return d
 
 def dict_to_user(data: dict) -> UserProfile:
+    # Absent optional keys fall back to the dataclass defaults
+    kwargs = {k: data[k] for k in _PLAIN_FIELDS if k in data}
+    for k in _REQUIRED_FIELDS:
+        kwargs.setdefault(k, None)
     return UserProfile(
-        user_id=data.get("user_id"),
-        age=data.get("age"),
-        gender=data.get("gender"),
-        symptoms=data.get("symptoms", []),
-        medical_conditions=data.get("medical_conditions", []),
         blood_tests=list_to_blood_tests(data.get("blood_tests", [])),
         wearable_data=dict_to_wearable(data.get("wearable_data")),
         feedback=dict_to_feedback(data.get("feedback")),
-        lifestyle=data.get("lifestyle", {}),
-        medical_history=data.get("medical_history", {}),
-        goals=data.get("goals", []),
-        medications=data.get("medications", []),
-        cluster_id=data.get("cluster_id"),
-        weight_kg=data.get("weight_kg"),
-        height_cm=data.get("height_cm"),
-        diet_type=data.get("diet_type"),
-        location=data.get("location")
+        **kwargs
     )
 print("Loading users from:", os.path.abspath(USERS_FILE))
+def _dumps_user(user: UserProfile) -> bytes:
+    return orjson.dumps(user_to_dict(user), option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+# Raw record lines from the last read, keyed on the file's (mtime, size) so an
+# unchanged users.jsonl is not re-read. Only the immutable bytes are cached:
+# each load parses a fresh dict, so callers that mutate a profile's lists
+# (feedback, cluster ids) never touch what later loads return.
+_CACHE_STAT = None
+_CACHE_RAW: Dict[str, bytes] = {}
+
+_ID_PREFIX = b'{"user_id":"'
+
+def _peek_user_id(line: bytes):
+    # Records written by _dumps_user start with the user_id, so it can be
+    # sliced out without parsing the rest of the line.
+    if line.startswith(_ID_PREFIX):
+        end = line.find(b'"', len(_ID_PREFIX))
+        uid = line[len(_ID_PREFIX):end]
+        if end != -1 and b"\\" not in uid:
+            return uid.decode()
+    return orjson.loads(line).get("user_id")
+
+def _load_index() -> Dict[str, bytes]:
+    """Latest raw record per user_id, in first-seen order."""
+    global _CACHE_STAT, _CACHE_RAW
+    try:
+        st = os.stat(USERS_FILE)
+    except FileNotFoundError:
+        return {}
+    key = (st.st_mtime_ns, st.st_size)
+    if key == _CACHE_STAT:
+        return _CACHE_RAW
+
+    # users.jsonl is append-only: a later line for the same user_id
+    # supersedes earlier ones, so keep the last record per id.
+    raw = {}
+    with open(USERS_FILE, "rb") as f:
+        for line in f:
+            if line.strip():
+                raw[_peek_user_id(line)] = line
+    _CACHE_STAT, _CACHE_RAW = key, raw
+    return _CACHE_RAW
+
 def load_all_users() -> List[UserProfile]:
-    if not os.path.exists(USERS_FILE):
-        return []
-    with open(USERS_FILE, "r") as f:
-        data = json.load(f)
-    return [dict_to_user(d) for d in data]
+    return [dict_to_user(orjson.loads(line)) for line in _load_index().values()]
+
+def load_user(user_id: str) -> Optional[UserProfile]:
+    line = _load_index().get(user_id)
+    if line is None:
+        return None
+    return dict_to_user(orjson.loads(line))
 
 def save_all_users(users: List[UserProfile]):
-    with open(USERS_FILE, "w") as f:
-        json.dump([user_to_dict(u) for u in users], f, indent=2)
+    # Full rewrite; also compacts superseded records left by save_user.
+    with open(USERS_FILE, "wb") as f:
+        f.write(b"".join(_dumps_user(u) for u in users))
 
 def save_user(user: UserProfile):
-    users = load_all_users()
-    for i, u in enumerate(users):
-        if u.user_id == user.user_id:
-            users[i] = user
-            break
-    else:
-        users.append(user)
-    save_all_users(users)
+    with open(USERS_FILE, "ab") as f:
+        f.write(_dumps_user(user))
+
+def save_users_bulk(users: List[UserProfile]):
+    # One append for the whole batch instead of one open/write per user.
+    with open(USERS_FILE, "ab") as f:
+        f.write(b"".join(_dumps_user(u) for u in users))
 
 # --------------------------
 # Test script
@@ -127,8 +170,7 @@ def test_storage():
     )
 
     save_user(user)
-    users = load_all_users()
-    loaded_user = next((u for u in users if u.user_id == "user123"), None)
+    loaded_user = load_user("user123")
 
     assert loaded_user is not None, "User not found after loading"
     assert loaded_user.age == 30, "Age mismatch"
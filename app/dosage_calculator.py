@@ -42,7 +42,9 @@ def determine_dosage(
 
     # 🛠 Filter out irrelevant iron warnings for females with known iron deficiency
     if nutrient.lower() == "iron":
-        if "iron deficiency" in [c.lower() for c in user.medical_conditions]:
+        if any(c.lower() == "iron deficiency" for c in user.medical_conditions) and any(
+            "hemochromatosis" in c.lower() for c in contraindications
+        ):
             contraindications = [c for c in contraindications if "hemochromatosis" not in c.lower()]
 
     return dosage, unit, contraindications
\ No newline at end of file
@@ -1,42 +1,57 @@
 from pathlib import Path
 # drug_interaction_checker.py
 
-import json
+import os
+from functools import lru_cache
 from typing import List
+
+import orjson
 from app.data_model import UserProfile, SupplementRecommendation
 
 # Path to local drug-supplement interaction JSON
 LOCAL_INTERACTION_DB = "drug_supp_interactions.json"
 
+@lru_cache(maxsize=1)
+def _load_interactions_cached(mtime_ns: int) -> dict:
+    # Keyed on mtime so edits to the JSON file are picked up without a restart.
+    # Values become frozensets so lookups can intersect instead of scanning lists.
+    with open(LOCAL_INTERACTION_DB, "rb") as f:
+        raw = orjson.loads(f.read())
+    return {med.lower(): frozenset(s.lower() for s in supps) for med, supps in raw.items()}
+
 def load_local_interactions() -> dict:
-    """Load drug–supplement interactions from JSON."""
+    """Load drug–supplement interactions from JSON (parsed once per file version)."""
     try:
-        with open(LOCAL_INTERACTION_DB, "r") as f:
-            return json.load(f)
+        return _load_interactions_cached(os.stat(LOCAL_INTERACTION_DB).st_mtime_ns)
     except FileNotFoundError:
         print(f"[Warning] Local interaction file {LOCAL_INTERACTION_DB} not found.")
         return {}
 
+def _lower_meds(user: UserProfile) -> List[str]:
+    return [m.lower() for m in user.medications or []]
+
 def check_from_local_json(user: UserProfile, recs: List[SupplementRecommendation]) -> List[str]:
     """
     Check user's medications against known supplement interactions from local DB.
     Returns a list of warning strings.
     """
     warnings = []
-    interactions = load_local_interactions()
+    meds = _lower_meds(user)
+    if not meds:
+        return warnings
 
-    meds = [m.lower() for m in user.medications or []]
+    interactions = load_local_interactions()
     supps = [r.name.lower() for r in recs]
+    supp_set = set(supps)
 
     for med in meds:
-        flagged = []
-        if med in interactions:
-            for supp in supps:
-                if supp in interactions[med]:
-                    flagged.append(supp.title())
-        if flagged:
-            warning = f"⚠️ May interact with {med.title()}: {', '.join(flagged)}"
-            warnings.append(warning)
+        hits = interactions.get(med)
+        if not hits or hits.isdisjoint(supp_set):
+            continue
+        # Keep recommendation order in the warning text
+        flagged = [supp.title() for supp in supps if supp in hits]
+        warning = f"⚠️ May interact with {med.title()}: {', '.join(flagged)}"
+        warnings.append(warning)
 
     return warnings
 
@@ -49,6 +64,10 @@ def attach_interaction_flags(user: UserProfile, recs: List[SupplementRecommendat
     else:
         warnings_map = get_interaction_flags_local(user, recs)
 
+    # Most users have no interactions; skip lowercasing every rec name then
+    if not warnings_map:
+        return recs
+
     for rec in recs:
         rec_warnings = warnings_map.get(rec.name.lower(), [])
         rec.validation_flags.extend(rec_warnings)
@@ -59,18 +78,20 @@ def get_interaction_flags_local(user: UserProfile, recs: List[SupplementRecommen
     """
     Builds a {supplement: [warnings]} map based on local JSON interactions.
     """
+    meds = _lower_meds(user)
+    if not meds:
+        return {}
+
     interactions = load_local_interactions()
-    meds = [m.lower() for m in user.medications or []]
+    names = {rec.name.lower() for rec in recs}
     result = {}
 
-    for rec in recs:
-        name = rec.name.lower()
-        flags = []
-        for med in meds:
-            if med in interactions and name in interactions[med]:
-                flags.append(f"⚠️ Interacts with {med}")
-        if flags:
-            result[name] = flags
+    for med in meds:
+        hits = interactions.get(med)
+        if not hits:
+            continue
+        for name in hits & names:
+            result.setdefault(name, []).append(f"⚠️ Interacts with {med}")
     return result
 
 # Placeholder for external API integration (optional future feature)
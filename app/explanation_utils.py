@@ -4,6 +4,31 @@ from pathlib import Path
 from typing import List, Dict, Optional, Union
 from app.data_model import SupplementRecommendation
 
+# inputs_triggered prefix -> bucket; both feedback kinds share one bucket so
+# their relative order is kept.
+_INPUT_BUCKETS = {
+    "goal": "goals",
+    "blood_test": "blood_tests",
+    "wearable": "wearables",
+    "feedback": "feedback",
+    "feedback symptom": "feedback",
+}
+
+def _bucket_inputs(rec: SupplementRecommendation) -> Dict[str, List[str]]:
+    """
+    Split rec.inputs_triggered by prefix in a single pass, with prefixes stripped.
+    "low_sunlight" is non-empty when any input mentions sunlight exposure.
+    """
+    buckets = {"goals": [], "blood_tests": [], "wearables": [], "feedback": [], "low_sunlight": []}
+    for s in rec.inputs_triggered or ():
+        prefix, sep, rest = s.partition(": ")
+        key = _INPUT_BUCKETS.get(prefix) if sep else None
+        if key:
+            buckets[key].append(rest)
+        if "sunlight_exposure_minutes" in s:
+            buckets["low_sunlight"].append(s)
+    return buckets
+
 def build_concise_explanation(rec: SupplementRecommendation) -> str:
     """
     Build a concise explanation string for a SupplementRecommendation object.
@@ -16,28 +41,25 @@ def build_concise_explanation(rec: SupplementRecommendation) -> str:
     if top_symptoms:
         parts.append("symptoms: " + ", ".join(top_symptoms))
 
-    # Extract goals from inputs_triggered
-    goals = [s.replace("goal: ", "") for s in rec.inputs_triggered if s.startswith("goal: ")]
-    top_goals = goals[:3]
+    inputs = _bucket_inputs(rec)
+
+    top_goals = inputs["goals"][:3]
     if top_goals:
         parts.append("goals: " + ", ".join(top_goals))
 
-    # Blood test lines: look for inputs like "blood_test: Marker=Value Unit"
-    blood_tests = [s for s in rec.inputs_triggered if s.startswith("blood_test: ")]
-    if blood_tests:
-        parts.append("lab results: " + ", ".join(bt.replace("blood_test: ", "") for bt in blood_tests))
+    # Blood test lines: inputs like "blood_test: Marker=Value Unit"
+    if inputs["blood_tests"]:
+        parts.append("lab results: " + ", ".join(inputs["blood_tests"]))
 
     # Wearable highlights: look for wearables and low sunlight exposure
-    wearables = [s.replace("wearable: ", "") for s in rec.inputs_triggered if s.startswith("wearable: ")]
-    if any("sunlight_exposure_minutes" in s for s in rec.inputs_triggered):
+    if inputs["low_sunlight"]:
         parts.append("low sunlight exposure")
-    elif wearables:
-        parts.append("wearable data: " + ", ".join(wearables[:3]))
+    elif inputs["wearables"]:
+        parts.append("wearable data: " + ", ".join(inputs["wearables"][:3]))
 
     # Recent feedback highlights (energy, mood, stress)
-    feedbacks = [s for s in rec.inputs_triggered if s.startswith("feedback: ") or s.startswith("feedback symptom: ")]
-    if feedbacks:
-        parts.append("recent feedback: " + ", ".join(fb.replace("feedback: ", "").replace("feedback symptom: ", "") for fb in feedbacks[:3]))
+    if inputs["feedback"]:
+        parts.append("recent feedback: " + ", ".join(inputs["feedback"][:3]))
 
     if not parts:
         return "Recommended based on your profile."
@@ -48,26 +70,22 @@ def build_structured_explanation(rec: SupplementRecommendation) -> Dict[str, Uni
     """
     Create a dict representing a user-friendly explanation broken into categories.
     """
+    inputs = _bucket_inputs(rec)
     explanation = {
         "symptoms": rec.triggered_by[:3] if rec.triggered_by else [],
-        "goals": [s.replace("goal: ", "") for s in rec.inputs_triggered if s.startswith("goal: ")][:3],
-        "lab_results": [s.replace("blood_test: ", "") for s in rec.inputs_triggered if s.startswith("blood_test: ")],
+        "goals": inputs["goals"][:3],
+        "lab_results": inputs["blood_tests"],
         "wearable_data": [],
-        "recent_feedback": [],
+        "recent_feedback": inputs["feedback"][:3],
         "warnings": rec.validation_flags or [],
         "contraindications": rec.contraindications or []
     }
 
     # Add wearables and low sunlight exposure
-    wearables = [s.replace("wearable: ", "") for s in rec.inputs_triggered if s.startswith("wearable: ")]
-    if any("sunlight_exposure_minutes" in s for s in rec.inputs_triggered):
+    if inputs["low_sunlight"]:
         explanation["wearable_data"].append("low sunlight exposure")
-    elif wearables:
-        explanation["wearable_data"].extend(wearables[:3])
-
-    # Add feedback
-    feedbacks = [s.replace("feedback: ", "").replace("feedback symptom: ", "") for s in rec.inputs_triggered if s.startswith("feedback: ") or s.startswith("feedback symptom: ")]
-    explanation["recent_feedback"].extend(feedbacks[:3])
+    elif inputs["wearables"]:
+        explanation["wearable_data"].extend(inputs["wearables"][:3])
 
     return explanation
 
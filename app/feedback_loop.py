@@ -7,6 +7,12 @@ from app.symptom_scorer import SYMPTOM_NUTRIENT_MAP
 
 TREND_WINDOW = 3  # Number of feedback points to evaluate trend
 
+# Symptom -> tuple of nutrients, built once instead of per trend lookup
+_SYMPTOM_NUTRIENTS = {k.lower(): tuple(v) for k, v in SYMPTOM_NUTRIENT_MAP.items()}
+
+# A symptom has a trend when its last TREND_WINDOW statuses all agree
+_TREND_BY_STATUS = {"worsening": "worsening", "improving": "improving", "same": "stagnant"}
+
 
 # 🔁 === Core Learning Engine ===
 def update_nutrient_scores_with_feedback(user: UserProfile, nutrient_scores: Dict[str, float]) -> Dict[str, float]:
@@ -17,22 +23,18 @@ def update_nutrient_scores_with_feedback(user: UserProfile, nutrient_scores: Dic
     today = datetime.date.today().isoformat()
     symptom_changes = user.feedback.symptom_changes if user.feedback and user.feedback.symptom_changes else {}
 
-    if not user.symptom_history:
-        user.symptom_history = {}
-
-    # Append current feedback to symptom history
+    # Append current feedback to symptom history (a dict by dataclass default)
+    history = user.symptom_history
     for symptom, status in symptom_changes.items():
         normalized_status = normalize_status(status)
-        if symptom not in user.symptom_history:
-            user.symptom_history[symptom] = []
-        user.symptom_history[symptom].append({"date": today, "status": normalized_status})
+        history.setdefault(symptom, []).append({"date": today, "status": normalized_status})
 
     # Detect trends in feedback
     trends = detect_trend(user.symptom_history)
 
     # Adjust nutrient scores based on trends
     for symptom, trend in trends.items():
-        nutrients = SYMPTOM_NUTRIENT_MAP.get(symptom.lower(), [])
+        nutrients = _SYMPTOM_NUTRIENTS.get(symptom.lower(), ())
         for nutrient in nutrients:
             if trend == "worsening":
                 nutrient_scores[nutrient] = nutrient_scores.get(nutrient, 0) + 0.2
@@ -54,13 +56,11 @@ def detect_trend(history: Dict[str, list]) -> Dict[str, str]:
     for symptom, entries in history.items():
         if len(entries) < TREND_WINDOW:
             continue
-        last_statuses = [entry["status"] for entry in entries[-TREND_WINDOW:]]
-        if all(s == "worsening" for s in last_statuses):
-            trends[symptom] = "worsening"
-        elif all(s == "improving" for s in last_statuses):
-            trends[symptom] = "improving"
-        elif all(s == "same" for s in last_statuses):
-            trends[symptom] = "stagnant"
+        statuses = {entry["status"] for entry in entries[-TREND_WINDOW:]}
+        if len(statuses) == 1:
+            trend = _TREND_BY_STATUS.get(statuses.pop())
+            if trend:
+                trends[symptom] = trend
     return trends
 
 
@@ -71,10 +71,8 @@ def log_dose_response(user: UserProfile):
     today = datetime.date.today().isoformat()
     feedback_changes = user.feedback.symptom_changes if user.feedback else {}
 
-    if not hasattr(user, "dose_response_log") or user.dose_response_log is None:
-        user.dose_response_log = []
-
-    if not hasattr(user, "recommendations") or not user.recommendations:
+    # dose_response_log always exists via the UserProfile default_factory
+    if not user.recommendations:
         return
 
     for rec in user.recommendations:
@@ -103,6 +101,12 @@ def normalize_status(status: str) -> str:
 
 
 # 🆕 === UI / Display Only: Adds flags for explanations ===
+_FEEDBACK_FLAGS = {
+    "improving": "✅ User reported improvement",
+    "worsening": "⚠️ Symptom worsened",
+    "same": "ℹ️ No change reported",
+}
+
 def label_recommendations_with_feedback(user: UserProfile, recs: List[SupplementRecommendation]) -> List[SupplementRecommendation]:
     """
     Adds user-friendly feedback flags to supplement recommendations.
@@ -111,20 +115,19 @@ def label_recommendations_with_feedback(user: UserProfile, recs: List[Supplement
     if not user.feedback or not user.feedback.symptom_changes:
         return recs
 
-    symptom_changes = user.feedback.symptom_changes
+    # Normalize the feedback once, not per recommendation
+    changes = [
+        (symptom.lower(), _FEEDBACK_FLAGS[normalized])
+        for symptom, change in user.feedback.symptom_changes.items()
+        if (normalized := normalize_status(change)) in _FEEDBACK_FLAGS
+    ]
+    if not changes:
+        return recs
+
     for rec in recs:
-        for symptom, change in symptom_changes.items():
-            normalized = normalize_status(change)
-            if normalized == "improving":
-                flag = "✅ User reported improvement"
-            elif normalized == "worsening":
-                flag = "⚠️ Symptom worsened"
-            elif normalized == "same":
-                flag = "ℹ️ No change reported"
-            else:
-                continue
-
-            if symptom.lower() in [s.lower() for s in rec.triggered_by]:
+        triggered = {s.lower() for s in rec.triggered_by}
+        for symptom, flag in changes:
+            if symptom in triggered:
                 rec.validation_flags.append(flag)
 
     return recs
\ No newline at end of file
@@ -1,27 +1,32 @@
 from pathlib import Path
 from app.data_model import UserProfile, BloodTestResult, WearableMetrics, UserFeedback
-from app.data_storage import save_user
+from app.data_storage import save_users_bulk
 import random
 import uuid
 from typing import List, Optional
 
-def generate_random_user(index: int) -> UserProfile:
-    genders = ["male", "female"]
-    all_symptoms = [
-        "fatigue", "brain fog", "poor sleep", "low energy",
-        "bloating", "dry skin", "mood swings", "low libido"
-    ]
-    medical_conditions = [
-        [], ["hypothyroidism"], ["pcos"], ["depression"],
-        ["anemia"], ["insulin resistance"]
-    ]
-    markers = [
-        ("vitamin d", 20.0, "ng/mL"),
-        ("iron", 50.0, "µg/dL"),
-        ("b12", 300.0, "pg/mL"),
-        ("ferritin", 30.0, "ng/mL")
-    ]
+import numpy as np
+
+GENDERS = ["male", "female"]
+ALL_SYMPTOMS = [
+    "fatigue", "brain fog", "poor sleep", "low energy",
+    "bloating", "dry skin", "mood swings", "low libido"
+]
+MEDICAL_CONDITIONS = [
+    [], ["hypothyroidism"], ["pcos"], ["depression"],
+    ["anemia"], ["insulin resistance"]
+]
+MARKERS = [
+    ("vitamin d", 20.0, "ng/mL"),
+    ("iron", 50.0, "µg/dL"),
+    ("b12", 300.0, "pg/mL"),
+    ("ferritin", 30.0, "ng/mL")
+]
+FEEDBACK_CHANGES = ["better", "same", "worse"]
+FEEDBACK_ENERGY = ["low", "normal", "high"]
+FEEDBACK_STRESS = ["low", "medium", "high"]
 
+def generate_random_user(index: int) -> UserProfile:
     wearable = WearableMetrics(
         sleep_hours=round(random.uniform(5.0, 8.5), 1),
         hrv=round(random.uniform(20.0, 60.0), 1),
@@ -33,28 +38,29 @@ def generate_random_user(index: int) -> UserProfile:
     )
 
     feedback = UserFeedback(
-        mood=random.choice(["better", "same", "worse"]),
-        energy=random.choice(["low", "normal", "high"]),
-        stress=random.choice(["low", "medium", "high"]),
-        symptoms=random.sample(all_symptoms, k=2),
+        mood=random.choice(FEEDBACK_CHANGES),
+        energy=random.choice(FEEDBACK_ENERGY),
+        stress=random.choice(FEEDBACK_STRESS),
+        symptoms=random.sample(ALL_SYMPTOMS, k=2),
         symptom_changes={
-            sym: random.choice(["better", "same", "worse"])
-            for sym in random.sample(all_symptoms, k=2)
+            sym: random.choice(FEEDBACK_CHANGES)
+            for sym in random.sample(ALL_SYMPTOMS, k=2)
         }
     )
 
     return UserProfile(
         user_id=f"mock_user_{index}_{uuid.uuid4().hex[:6]}",
         age=random.randint(20, 50),
-        gender=random.choice(genders),
-        symptoms=random.sample(all_symptoms, k=3),
-        medical_conditions=random.choice(medical_conditions),
+        gender=random.choice(GENDERS),
+        symptoms=random.sample(ALL_SYMPTOMS, k=3),
+        # Copy: the choice is one of the shared MEDICAL_CONDITIONS lists
+        medical_conditions=list(random.choice(MEDICAL_CONDITIONS)),
         blood_tests=[
             BloodTestResult(
                 marker=m[0],
                 value=round(m[1] + random.uniform(-10, 10), 2),
                 unit=m[2]
-            ) for m in markers
+            ) for m in MARKERS
         ],
         wearable_data=wearable,
         feedback=feedback,
@@ -67,13 +73,84 @@ def generate_multiple_users(count: int, seed: Optional[int] = None) -> List[User
     users = [generate_random_user(i) for i in range(count)]
     return users
 
+def _sample_symptoms(rng: np.random.Generator, count: int, k: int) -> List[List[str]]:
+    # k distinct symptoms per row: argsort of uniform noise is a random permutation
+    picks = rng.random((count, len(ALL_SYMPTOMS))).argsort(axis=1)[:, :k]
+    return [[ALL_SYMPTOMS[j] for j in row] for row in picks.tolist()]
+
+def generate_multiple_users_fast(count: int, seed: Optional[int] = None) -> List[UserProfile]:
+    """
+    Same distributions as generate_random_user, but every random column is
+    drawn for all users at once with numpy and then zipped into profiles.
+    """
+    rng = np.random.default_rng(seed)
+
+    sleep = rng.uniform(5.0, 8.5, count).round(1).tolist()
+    hrv = rng.uniform(20.0, 60.0, count).round(1).tolist()
+    resting_hr = rng.uniform(55.0, 75.0, count).round(1).tolist()
+    activity = rng.uniform(2.0, 7.0, count).round(1).tolist()
+    temp_var = rng.uniform(0.1, 0.5, count).round(2).tolist()
+    spo2 = rng.uniform(95.0, 99.0, count).round(1).tolist()
+    sunlight = rng.integers(10, 91, count).tolist()
+
+    mood = rng.integers(0, len(FEEDBACK_CHANGES), count).tolist()
+    energy = rng.integers(0, len(FEEDBACK_ENERGY), count).tolist()
+    stress = rng.integers(0, len(FEEDBACK_STRESS), count).tolist()
+    feedback_symptoms = _sample_symptoms(rng, count, 2)
+    changed_symptoms = _sample_symptoms(rng, count, 2)
+    changes = rng.integers(0, len(FEEDBACK_CHANGES), (count, 2)).tolist()
+
+    ages = rng.integers(20, 51, count).tolist()
+    gender_idx = rng.integers(0, len(GENDERS), count).tolist()
+    symptoms = _sample_symptoms(rng, count, 3)
+    cond_idx = rng.integers(0, len(MEDICAL_CONDITIONS), count).tolist()
+    marker_values = (
+        np.array([m[1] for m in MARKERS]) + rng.uniform(-10, 10, (count, len(MARKERS)))
+    ).round(2).tolist()
+    id_suffix = rng.integers(0, 16 ** 6, count).tolist()
+
+    users = []
+    for i in range(count):
+        users.append(UserProfile(
+            user_id=f"mock_user_{i}_{id_suffix[i]:06x}",
+            age=ages[i],
+            gender=GENDERS[gender_idx[i]],
+            symptoms=symptoms[i],
+            medical_conditions=list(MEDICAL_CONDITIONS[cond_idx[i]]),
+            blood_tests=[
+                BloodTestResult(marker=m[0], value=v, unit=m[2])
+                for m, v in zip(MARKERS, marker_values[i])
+            ],
+            wearable_data=WearableMetrics(
+                sleep_hours=sleep[i],
+                hrv=hrv[i],
+                resting_hr=resting_hr[i],
+                activity_level=activity[i],
+                temperature_variation=temp_var[i],
+                spo2=spo2[i],
+                sunlight_exposure_minutes=sunlight[i]
+            ),
+            feedback=UserFeedback(
+                mood=FEEDBACK_CHANGES[mood[i]],
+                energy=FEEDBACK_ENERGY[energy[i]],
+                stress=FEEDBACK_STRESS[stress[i]],
+                symptoms=feedback_symptoms[i],
+                symptom_changes={
+                    sym: FEEDBACK_CHANGES[c]
+                    for sym, c in zip(changed_symptoms[i], changes[i])
+                }
+            ),
+            cluster_id=None
+        ))
+    return users
+
 def save_multiple_users(users: List[UserProfile]) -> None:
+    save_users_bulk(users)
     for user in users:
-        save_user(user)
         print(f"✅ Saved mock user: {user.user_id}")
 
 def main(count: int = 4, seed: Optional[int] = None) -> List[UserProfile]:
-    users = generate_multiple_users(count, seed)
+    users = generate_multiple_users_fast(count, seed)
     save_multiple_users(users)
     return users
 
@@ -4,6 +4,9 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from supabase import create_client
+from supabase.lib.client_options import SyncClientOptions
+from postgrest.exceptions import APIError
+import httpx
 import os
 from dotenv import load_dotenv
 
@@ -16,8 +19,24 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 print(f"SUPABASE_URL: {SUPABASE_URL}")
 print(f"SUPABASE_KEY: {'set' if SUPABASE_KEY else 'NOT set!'}")  # Just to check if key is loaded
 
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "50"))
+
+# One pooled HTTP/2 client for every request this router makes, so sync
+# endpoints running on the threadpool reuse warm connections instead of
+# paying a TCP+TLS handshake each time.
+_http_client = httpx.Client(
+    http2=True,
+    follow_redirects=True,
+    timeout=10.0,
+    limits=httpx.Limits(
+        max_connections=SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+    ),
+)
+
 # Now create the supabase client
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = create_client(SUPABASE_URL, SUPABASE_KEY, options=SyncClientOptions(httpx_client=_http_client))
 
 router = APIRouter(prefix="/grocery", tags=["grocery"])
 
@@ -29,6 +48,9 @@ class GroceryDataCreate(BaseModel):
     household_size: Optional[int]
     eats_at_home: Optional[bool]
 
+class GroceryBulkCreate(BaseModel):
+    items: List[GroceryDataCreate]
+
 class GroceryDataUpdate(BaseModel):
     store_name: Optional[str]
     receipt_data: Optional[Dict[str, Any]]
@@ -38,11 +60,24 @@ class GroceryDataUpdate(BaseModel):
 
 @router.post("/", status_code=201)
 def create_grocery_data(data: GroceryDataCreate):
-    response = supabase.table("grocery_data").insert(data.dict()).execute()
+    response = supabase.table("grocery_data").insert(data.model_dump(mode="json", exclude_none=True)).execute()
     if response.error:
         raise HTTPException(status_code=400, detail=response.error.message)
     return response.data
 
+@router.post("/bulk", status_code=201)
+def create_grocery_data_bulk(data: GroceryBulkCreate):
+    # PostgREST accepts an array body, so N rows cost one round-trip
+    if not data.items:
+        return []
+    rows = [item.model_dump(mode="json", exclude_none=True) for item in data.items]
+    # postgrest raises APIError on failure; the response itself has no .error
+    try:
+        response = supabase.table("grocery_data").insert(rows).execute()
+    except APIError as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    return response.data
+
 @router.get("/{grocery_id}")
 def read_grocery_data(grocery_id: str):
     response = supabase.table("grocery_data").select("*").eq("id", grocery_id).single().execute()
@@ -52,7 +87,7 @@ def read_grocery_data(grocery_id: str):
 
 @router.patch("/{grocery_id}")
 def update_grocery_data(grocery_id: str, data: GroceryDataUpdate):
-    response = supabase.table("grocery_data").update(data.dict(exclude_unset=True)).eq("id", grocery_id).execute()
+    response = supabase.table("grocery_data").update(data.model_dump(mode="json", exclude_unset=True)).eq("id", grocery_id).execute()
     if response.error:
         raise HTTPException(status_code=400, detail=response.error.message)
     return response.data
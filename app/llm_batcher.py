@@ -0,0 +1,153 @@
+# app/llm_batcher.py
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+from app.data_model import UserProfile
+from app.llm_planner import _compact_user, plan_with_llm_async, plan_with_llm_batch_async
+
+logger = logging.getLogger("uvicorn.error")
+
+LLM_BATCH_ENABLED = os.getenv("LLM_BATCH_ENABLED") == "1"
+LLM_BATCH_WINDOW = float(os.getenv("LLM_BATCH_WINDOW_MS", "250")) / 1000
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "8"))
+# Rough prompt budget for the user payloads of one batch (~4 chars per token,
+# so ~6k tokens); a submit that would exceed it flushes the window first.
+LLM_BATCH_MAX_CHARS = int(os.getenv("LLM_BATCH_MAX_CHARS", "24000"))
+
+_Pending = Tuple[
+    UserProfile, Optional[List[Dict[str, Any]]], Dict[str, Any], "asyncio.Future[Dict[str, Any]]"
+]
+
+
+class PlanBatcher:
+    """
+    Collects concurrent planner calls for up to `window` seconds (or until
+    `max_size` users / `max_chars` of user payload are pending) and answers
+    them with one multi-user completion. A window holding a single user goes
+    through plan_with_llm_async instead, so it still hits the plan cache.
+    """
+
+    def __init__(
+        self,
+        window: float = LLM_BATCH_WINDOW,
+        max_size: int = LLM_BATCH_MAX_SIZE,
+        max_chars: int = LLM_BATCH_MAX_CHARS,
+        model: Optional[str] = None,
+        max_supps: int = 6,
+        max_groceries: int = 10,
+        max_recipes: int = 3,
+        temperature: float = 0.0,
+    ):
+        self.window = window
+        self.max_size = max(1, max_size)
+        self.max_chars = max_chars
+        self.plan_kwargs = {
+            "model": model,
+            "max_supps": max_supps,
+            "max_groceries": max_groceries,
+            "max_recipes": max_recipes,
+            "temperature": temperature,
+        }
+        self._pending: List[_Pending] = []
+        self._chars = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def submit(
+        self,
+        user: UserProfile,
+        grocery_context: Optional[List[Dict[str, Any]]] = None,
+        grocery_nutrients: Optional[Dict[str, float]] = None,
+    ) -> Dict[str, Any]:
+        """Plan for one user, shaped like plan_with_llm_async's result."""
+        if grocery_nutrients:
+            # The batch prompt carries grocery items only, not nutrient totals
+            return await plan_with_llm_async(
+                user, grocery_context=grocery_context, grocery_nutrients=grocery_nutrients, **self.plan_kwargs
+            )
+
+        # The compact payload is built once here and reused by the batch prompt
+        compact = _compact_user(user)
+        size = len(orjson.dumps(compact, option=orjson.OPT_SERIALIZE_NUMPY))
+        # Plans are matched back by user_id, so one id can't appear twice in a batch
+        if self._pending and (
+            self._chars + size > self.max_chars
+            or any(u.user_id == user.user_id for u, _, _, _ in self._pending)
+        ):
+            self._flush()
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((user, grocery_context, compact, fut))
+        self._chars += size
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._chars = self._pending, [], 0
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_Pending]) -> None:
+        results: Dict[str, Any] = {}
+        try:
+            if len(batch) > 1:
+                users = [u for u, _, _, _ in batch]
+                results.update(await plan_with_llm_batch_async(
+                    users,
+                    grocery_contexts={u.user_id: ctx for u, ctx, _, _ in batch if ctx},
+                    batch_size=len(users),
+                    compact_users={u.user_id: compact for u, _, compact, _ in batch},
+                    **self.plan_kwargs,
+                ))
+        except Exception as e:
+            # Fall back to one call per user below, but leave a trace: a batch
+            # that keeps failing turns every window into N+1 calls
+            logger.warning(
+                f"Batch plan for {len(batch)} users failed, planning individually: {e}", exc_info=True
+            )
+
+        # Single-user windows, plus anyone the batch reply skipped
+        missing = [(u, ctx) for u, ctx, _, _ in batch if u.user_id not in results]
+        singles = await asyncio.gather(
+            *(plan_with_llm_async(u, grocery_context=ctx, **self.plan_kwargs) for u, ctx in missing),
+            return_exceptions=True,
+        )
+        for (u, _), plan in zip(missing, singles):
+            results[u.user_id] = plan
+
+        for u, _, _, fut in batch:
+            if fut.done():
+                continue
+            plan = results[u.user_id]
+            if isinstance(plan, asyncio.CancelledError):
+                fut.cancel()
+            elif isinstance(plan, BaseException):
+                fut.set_exception(plan)
+            else:
+                fut.set_result(plan)
+
+
+_default_batcher = PlanBatcher()
+
+
+async def submit(
+    user: UserProfile,
+    grocery_context: Optional[List[Dict[str, Any]]] = None,
+    grocery_nutrients: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    """Plan for one user through the process-wide batcher."""
+    return await _default_batcher.submit(user, grocery_context, grocery_nutrients)
@@ -1,31 +1,65 @@
 # app/llm_planner.py
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
-import os, json, re, logging
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional
+import os, re, logging, hashlib, asyncio
 
-from openai import OpenAI
+import orjson
+
+from app.cache_utils import TTLCache
+from app.openai_utils import get_async_openai_client, get_openai_client
 from app.data_model import UserProfile
 from app.unit_converter import normalize_blood_test_marker
 
 logger = logging.getLogger("uvicorn.error")
 
+PLAN_MAX_TOKENS = 1800  # completion budget per user plan
+
+# At (near-)zero temperature an identical request yields the same plan, so the
+# raw reply is cached on a hash of the full request to make repeat clicks free.
+PLAN_CACHE_MAX_TEMPERATURE = 0.1
+_PLAN_CACHE = TTLCache(
+    maxsize=int(os.getenv("LLM_PLAN_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("LLM_PLAN_CACHE_TTL", "3600")),
+)
+# Cache keys whose completion is currently in flight on the event loop, so a
+# burst of identical requests (double submits, retries) shares one call
+# instead of all missing the cache at once.
+_PLAN_INFLIGHT: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+LLM_PLANNER_BATCH_SIZE = int(os.getenv("LLM_PLANNER_BATCH_SIZE", "5"))
+# Upper bound on in-flight completions from plan_many_async; size it to the
+# account's rate limit rather than the number of users.
+LLM_PLANNER_CONCURRENCY = int(os.getenv("LLM_PLANNER_CONCURRENCY", "16"))
+
+def _dumps(obj: Any) -> str:
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+_FENCE_PREFIX = re.compile(r"^```(?:json)?\n?")
+_FENCE_SUFFIX = re.compile(r"\n```$")
+
 def _strip_code_fence(text: str) -> str:
     if not isinstance(text, str):
         return text
     t = text.strip()
     if t.startswith("```"):
-        t = re.sub(r"^```(?:json)?\n?", "", t)
-        t = re.sub(r"\n```$", "", t)
+        t = _FENCE_PREFIX.sub("", t)
+        t = _FENCE_SUFFIX.sub("", t)
     return t
 
 def _coerce_json(text: str) -> Dict[str, Any]:
+    # JSON mode replies are plain JSON; only fall back to fence/span cleanup
+    # for replies that aren't (e.g. a model without response_format support)
+    try:
+        return orjson.loads(text)
+    except Exception:
+        pass
     t = _strip_code_fence(text)
     try:
-        return json.loads(t)
+        return orjson.loads(t)
     except Exception:
-        m = re.search(r"\{[\s\S]*\}", t)
-        if m:
-            return json.loads(m.group(0))
+        # Outermost {...} span: first "{" to last "}", found without regex backtracking
+        start, end = t.find("{"), t.rfind("}")
+        if start != -1 and end > start:
+            return orjson.loads(t[start:end + 1])
         raise
 
 def _compact_user(user: UserProfile) -> Dict[str, Any]:
@@ -37,17 +71,31 @@ def _compact_user(user: UserProfile) -> Dict[str, Any]:
         except Exception:
             blood_tests.append({"marker": bt.marker, "value": bt.value, "unit": bt.unit})
 
+    w = user.wearable_data
     wearable = None
-    if user.wearable_data:
+    if w:
         wearable = {
-            "sleep_hours": user.wearable_data.sleep_hours,
-            "hrv": user.wearable_data.hrv,
-            "resting_hr": user.wearable_data.resting_hr,
-            "activity_level": user.wearable_data.activity_level,
-            "temperature_variation": user.wearable_data.temperature_variation,
-            "spo2": user.wearable_data.spo2,
-            "sunlight_exposure_minutes": user.wearable_data.sunlight_exposure_minutes,
+            "sleep_hours": w.sleep_hours,
+            "hrv": w.hrv,
+            "resting_hr": w.resting_hr,
+            "activity_level": w.activity_level,
+            "temperature_variation": w.temperature_variation,
+            "spo2": w.spo2,
+            "sunlight_exposure_minutes": w.sunlight_exposure_minutes,
+        }
+
+    # getattr keeps duck-typed feedback objects (missing fields) working
+    fb = user.feedback
+    if fb:
+        feedback = {
+            "mood": getattr(fb, "mood", None),
+            "energy": getattr(fb, "energy", None),
+            "stress": getattr(fb, "stress", None),
+            "symptoms": getattr(fb, "symptoms", []),
+            "symptom_changes": getattr(fb, "symptom_changes", {}),
         }
+    else:
+        feedback = {"mood": None, "energy": None, "stress": None, "symptoms": [], "symptom_changes": {}}
 
     return {
         "user_id": user.user_id,
@@ -61,15 +109,188 @@ def _compact_user(user: UserProfile) -> Dict[str, Any]:
         "lifestyle": user.lifestyle or {},
         "blood_tests": blood_tests,
         "wearable_data": wearable,
-        "feedback": {
-            "mood": getattr(user.feedback, "mood", None) if user.feedback else None,
-            "energy": getattr(user.feedback, "energy", None) if user.feedback else None,
-            "stress": getattr(user.feedback, "stress", None) if user.feedback else None,
-            "symptoms": getattr(user.feedback, "symptoms", []) if user.feedback else [],
-            "symptom_changes": getattr(user.feedback, "symptom_changes", {}) if user.feedback else {},
+        "feedback": feedback,
+    }
+
+_SYSTEM_PROMPT = (
+    "You are a clinical-grade nutrition & supplement planning assistant. "
+    "Create a concise, personalized plan consisting of: "
+    "(1) supplements, (2) grocery items (specific foods), (3) recipes (ingredients + steps), and (4) a single-string timeframe "
+    "for how long it may take to restore nutritional balance. "
+    "You are fully responsible for item choices and dosages. "
+    "Return STRICT JSON only (no prose, no code fences)."
+)
+
+_SCHEMA_HINT = {
+    "type": "object",
+    "properties": {
+        "rebalance_timeframe": {"type": "string"},
+        "recommendations": {
+            "type": "array",
+            "description": "Supplements",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "dosage": {"type": "number"},
+                    "unit": {"type": "string"},
+                    "reason": {"type": "string"},
+                    "triggered_by": {"type": "array", "items": {"type": "string"}},
+                    "contraindications": {"type": "array", "items": {"type": "string"}},
+                    "inputs_triggered": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["name", "dosage", "unit", "reason"]
+            }
+        },
+        "grocery_recommendations": {
+            "type": "array",
+            "description": "Specific foods to buy and eat more often",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "reason": {"type": "string"},
+                    "nutrient_tags": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "1-3 key nutrients this food supports, e.g. ['Omega-3','Iron']"
+                    }
+                },
+                "required": ["name"]
+            }
         },
+        "recipes": {
+            "type": "array",
+            "description": "Recipes that use the recommended foods",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "ingredients": {"type": "array", "items": {"type": "string"}},
+                    "instructions": {"type": "array", "items": {"type": "string"}},
+                    "nutritional_focus": {"type": "array", "items": {"type": "string"}},
+                    "estimated_time_minutes": {"type": "number"}
+                },
+                "required": ["title", "ingredients", "instructions"]
+            }
+        }
+    },
+    "required": ["recommendations", "grocery_recommendations", "recipes", "rebalance_timeframe"]
+}
+
+def _strict_schema(node: Any) -> Any:
+    """
+    Copy of a JSON schema made valid for strict structured outputs: every
+    object lists all its properties as required and forbids extras.
+    """
+    if isinstance(node, list):
+        return [_strict_schema(n) for n in node]
+    if not isinstance(node, dict):
+        return node
+    out = {k: _strict_schema(v) for k, v in node.items()}
+    if out.get("type") == "object" and "properties" in out:
+        out["required"] = list(out["properties"])
+        out["additionalProperties"] = False
+    return out
+
+# The schema is enforced out-of-band via structured outputs, so it no longer
+# has to be spelled out in the prompt.
+PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "supplement_plan", "strict": True, "schema": _strict_schema(_SCHEMA_HINT)},
+}
+BATCH_PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "supplement_plans",
+        "strict": True,
+        "schema": _strict_schema({
+            "type": "object",
+            "properties": {
+                "plans": {
+                    "type": "array",
+                    "items": {
+                        **_SCHEMA_HINT,
+                        "properties": {"user_id": {"type": "string"}, **_SCHEMA_HINT["properties"]},
+                    },
+                },
+            },
+        }),
+    },
+}
+
+# The system prompt and instructions are identical for every user. Keeping
+# them in their own messages ahead of anything per-request gives the provider
+# a stable prompt prefix it can cache; the message dicts are shared across
+# requests and must not be mutated.
+_SYSTEM_MSG = {"role": "system", "content": _SYSTEM_PROMPT}
+# Every planner request shares that prefix (plus the response schema), so they
+# all carry the same routing hint to land on the provider's warm prompt cache.
+PLAN_PROMPT_CACHE_KEY = os.getenv("LLM_PLAN_PROMPT_CACHE_KEY", "supplement-plan")
+_STATIC_USER_MSG = {
+    "role": "user",
+    "content": (
+        "Return ONLY a JSON plan. No prose. No code fences.\n"
+        "Supplements and foods should align with the user's needs and goals. "
+        "For each grocery recommendation, include 1–3 'nutrient_tags' that best describe its key nutrients "
+        "(e.g., 'Omega-3', 'Iron', 'Calcium', 'Magnesium', 'Vitamin D', 'Fiber', 'Potassium'). "
+        "Recipes should largely use the grocery items you recommend.\n"
+    ),
+}
+
+GROCERY_PROMPT_LIMIT = 200
+_GROCERY_PROMPT_FIELDS = (
+    "name", "category", "quantity", "unit", "package_count", "package_size_value",
+    "package_size_unit", "inferred_total_grams", "inferred_total_ml",
+)
+
+def _grocery_hint(
+    grocery_context: Optional[List[Dict[str, Any]]] = None,
+    grocery_nutrients: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    # Keep grocery payload compact: at most GROCERY_PROMPT_LIMIT distinct
+    # (name, category) items are sent, repeats are dropped before any dict is
+    # built, and fields the receipt didn't provide are left out entirely rather
+    # than spending prompt tokens on nulls.
+    grocery_context = grocery_context or []
+    groceries_brief: List[Dict[str, Any]] = []
+    seen = set()
+    for it in grocery_context:
+        key = (it.get("name"), it.get("category"))
+        if key in seen:
+            continue
+        seen.add(key)
+        brief = {}
+        for field in _GROCERY_PROMPT_FIELDS:
+            value = it.get(field)
+            if value is not None:
+                brief[field] = value
+        groceries_brief.append(brief)
+        if len(groceries_brief) >= GROCERY_PROMPT_LIMIT:
+            break
+
+    return {
+        "recent_groceries": groceries_brief,
+        "recent_grocery_count": len(grocery_context),
+        "grocery_nutrient_totals": grocery_nutrients or {},
     }
 
+def _log_prompt(messages: List[Dict[str, str]]) -> None:
+    # The full prompt (user health data included) is only dumped at DEBUG; at
+    # INFO a one-line size/hash summary is enough to correlate requests.
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "🧠 [LLM PLANNER] --- Prompt sent to model ---\n%s",
+            orjson.dumps(messages, option=orjson.OPT_INDENT_2).decode(),
+        )
+    elif logger.isEnabledFor(logging.INFO):
+        payload = messages[-1]["content"]
+        logger.info(
+            "🧠 [LLM PLANNER] prompt hash=%s tokens~%d",
+            hashlib.blake2b(payload.encode(), digest_size=8).hexdigest(),
+            sum(len(m["content"]) for m in messages) // 4,
+        )
+
 def _build_messages(
     user: UserProfile,
     max_supps: int,
@@ -79,124 +300,98 @@ def _build_messages(
     grocery_nutrients: Optional[Dict[str, float]] = None,
 ) -> List[Dict[str, str]]:
     user_payload = _compact_user(user)
+    # Only the batch prompt needs the id; build_user_profile mints a fresh uuid
+    # per request, which would give identical submissions different cache keys
+    del user_payload["user_id"]
+    grocery_hint = _grocery_hint(grocery_context, grocery_nutrients)
 
-    # Keep grocery payload compact; include any metrics if present
-    groceries_brief: List[Dict[str, Any]] = []
-    for it in (grocery_context or []):
-        groceries_brief.append({
-            "name": it.get("name"),
-            "category": it.get("category"),
-            "quantity": it.get("quantity"),
-            "unit": it.get("unit"),
-            "package_count": it.get("package_count"),
-            "package_size_value": it.get("package_size_value"),
-            "package_size_unit": it.get("package_size_unit"),
-            "inferred_total_grams": it.get("inferred_total_grams"),
-            "inferred_total_ml": it.get("inferred_total_ml"),
-        })
-
-    system = (
-        "You are a clinical-grade nutrition & supplement planning assistant. "
-        "Create a concise, personalized plan consisting of: "
-        "(1) supplements, (2) grocery items (specific foods), (3) recipes (ingredients + steps), and (4) a single-string timeframe "
-        "for how long it may take to restore nutritional balance. "
-        "You are fully responsible for item choices and dosages. "
-        "Return STRICT JSON only (no prose, no code fences)."
-    )
+    # Join orjson's bytes directly and decode once, rather than decoding each
+    # payload to str and copying it again into an f-string.
+    content = b"".join((
+        f"Max supplements: {max_supps}. Max groceries: {max_groceries}. Max recipes: {max_recipes}.\n\n".encode(),
+        b"user: ", orjson.dumps(user_payload, option=orjson.OPT_SERIALIZE_NUMPY),
+        b"\n\ncontext: ", orjson.dumps(grocery_hint, option=orjson.OPT_SERIALIZE_NUMPY),
+        b"\n",
+    )).decode()
+    user_msg = {"role": "user", "content": content}
 
-    schema_hint = {
-        "type": "object",
-        "properties": {
-            "rebalance_timeframe": {"type": "string"},
-            "recommendations": {
-                "type": "array",
-                "description": "Supplements",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "name": {"type": "string"},
-                        "dosage": {"type": "number"},
-                        "unit": {"type": "string"},
-                        "reason": {"type": "string"},
-                        "triggered_by": {"type": "array", "items": {"type": "string"}},
-                        "contraindications": {"type": "array", "items": {"type": "string"}},
-                        "inputs_triggered": {"type": "array", "items": {"type": "string"}}
-                    },
-                    "required": ["name", "dosage", "unit", "reason"]
-                }
-            },
-            "grocery_recommendations": {
-                "type": "array",
-                "description": "Specific foods to buy and eat more often",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "name": {"type": "string"},
-                        "reason": {"type": "string"},
-                        "nutrient_tags": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "1-3 key nutrients this food supports, e.g. ['Omega-3','Iron']"
-                        }
-                    },
-                    "required": ["name"]
-                }
-            },
-            "recipes": {
-                "type": "array",
-                "description": "Recipes that use the recommended foods",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "title": {"type": "string"},
-                        "ingredients": {"type": "array", "items": {"type": "string"}},
-                        "instructions": {"type": "array", "items": {"type": "string"}},
-                        "nutritional_focus": {"type": "array", "items": {"type": "string"}},
-                        "estimated_time_minutes": {"type": "number"}
-                    },
-                    "required": ["title", "ingredients", "instructions"]
-                }
-            }
-        },
-        "required": ["recommendations", "grocery_recommendations", "recipes", "rebalance_timeframe"]
-    }
-
-    grocery_hint = {
-        "recent_groceries": groceries_brief[:200],
-        "recent_grocery_count": len(groceries_brief),
-        "grocery_nutrient_totals": grocery_nutrients or {},
-    }
+    messages = [_SYSTEM_MSG, _STATIC_USER_MSG, user_msg]
+    _log_prompt(messages)
+    return messages
 
+def _build_batch_messages(
+    users: List[UserProfile],
+    max_supps: int,
+    max_groceries: int,
+    max_recipes: int,
+    grocery_contexts: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    compact_users: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[Dict[str, str]]:
+    compact_users = compact_users or {}
+    entries = [
+        {
+            "user": compact_users.get(u.user_id) or _compact_user(u),
+            "context": _grocery_hint((grocery_contexts or {}).get(u.user_id)),
+        }
+        for u in users
+    ]
     user_msg = {
         "role": "user",
         "content": (
-            "Return ONLY a JSON object matching this schema. No prose. No code fences.\n"
-            f"Max supplements: {max_supps}. Max groceries: {max_groceries}. Max recipes: {max_recipes}.\n"
-            "Supplements and foods should align with the user's needs and goals. "
-            "For each grocery recommendation, include 1–3 'nutrient_tags' that best describe its key nutrients "
-            "(e.g., 'Omega-3', 'Iron', 'Calcium', 'Magnesium', 'Vitamin D', 'Fiber', 'Potassium'). "
-            "Recipes should largely use the grocery items you recommend.\n\n"
-            f"schema: {json.dumps(schema_hint)}\n\n"
-            f"user: {json.dumps(user_payload)}\n\n"
-            f"context: {json.dumps(grocery_hint)}\n"
+            f"Plan for each of the {len(users)} users below independently. "
+            'Return ONLY {"plans": [...]}, one plan per user, '
+            'each carrying that user\'s "user_id".\n'
+            f"Max supplements: {max_supps}. Max groceries: {max_groceries}. Max recipes: {max_recipes}.\n\n"
+            f"users: {_dumps(entries)}\n"
         ),
     }
-
-    messages = [{"role": "system", "content": system}, user_msg]
-    try:
-        logger.info("🧠 [LLM PLANNER] --- Prompt sent to model ---")
-        logger.info(json.dumps(messages, indent=2))
-    except Exception:
-        pass
+    # Same static prefix as the single-user prompt, so it shares the prompt cache
+    messages = [_SYSTEM_MSG, _STATIC_USER_MSG, user_msg]
+    _log_prompt(messages)
     return messages
 
+def _planner_model(model: Optional[str]) -> str:
+    return model or os.getenv("LLM_PLANNER_MODEL", "gpt-4o-mini")
+
+def _completion_request(
+    user: UserProfile,
+    model: Optional[str],
+    max_supps: int,
+    max_groceries: int,
+    max_recipes: int,
+    temperature: float,
+    grocery_context: Optional[List[Dict[str, Any]]],
+    grocery_nutrients: Optional[Dict[str, float]],
+) -> Dict[str, Any]:
+    """chat.completions.create kwargs shared by the sync, async and streaming planners."""
+    return {
+        "model": _planner_model(model),
+        "messages": _build_messages(
+            user=user,
+            max_supps=max_supps,
+            max_groceries=max_groceries,
+            max_recipes=max_recipes,
+            grocery_context=grocery_context,
+            grocery_nutrients=grocery_nutrients,
+        ),
+        "temperature": temperature,
+        "max_tokens": PLAN_MAX_TOKENS,
+        "response_format": PLAN_RESPONSE_FORMAT,
+        "prompt_cache_key": PLAN_PROMPT_CACHE_KEY,
+    }
+
+def _plan_cache_key(request: Dict[str, Any]) -> Optional[str]:
+    if request["temperature"] > PLAN_CACHE_MAX_TEMPERATURE:
+        return None
+    return "plan:" + hashlib.blake2b(orjson.dumps(request), digest_size=16).hexdigest()
+
 def plan_with_llm(
     user: UserProfile,
     model: Optional[str] = None,
     max_supps: int = 6,
     max_groceries: int = 10,
     max_recipes: int = 3,
-    temperature: float = 0.2,
+    temperature: float = 0.0,
     grocery_context: Optional[List[Dict[str, Any]]] = None,
     grocery_nutrients: Optional[Dict[str, float]] = None,
     **kwargs,
@@ -205,46 +400,314 @@ def plan_with_llm(
     PURE LLM planner in one call (supplements + groceries + recipes + timeframe),
     with optional grocery context included in the prompt.
     """
-    model = model or os.getenv("LLM_PLANNER_MODEL", "gpt-4o-mini")
-    client = OpenAI()
-    messages = _build_messages(
-        user=user,
-        max_supps=max_supps,
-        max_groceries=max_groceries,
-        max_recipes=max_recipes,
-        grocery_context=grocery_context,
-        grocery_nutrients=grocery_nutrients,
+    request = _completion_request(
+        user, model, max_supps, max_groceries, max_recipes, temperature,
+        grocery_context, grocery_nutrients,
     )
+    key = _plan_cache_key(request)
+    content = _PLAN_CACHE.get(key) if key else None
+    if content is None:
+        resp = get_openai_client().chat.completions.create(**request)
+        content = resp.choices[0].message.content or "{}"
+        if key:
+            _PLAN_CACHE.set(key, content)
+    return parse_plan_response(content)
 
-    resp = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-        max_tokens=1800,
+async def plan_with_llm_async(
+    user: UserProfile,
+    model: Optional[str] = None,
+    max_supps: int = 6,
+    max_groceries: int = 10,
+    max_recipes: int = 3,
+    temperature: float = 0.0,
+    grocery_context: Optional[List[Dict[str, Any]]] = None,
+    grocery_nutrients: Optional[Dict[str, float]] = None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Same as plan_with_llm, but awaits the completion on the shared AsyncOpenAI
+    client so concurrent requests overlap on the event loop.
+    """
+    request = _completion_request(
+        user, model, max_supps, max_groceries, max_recipes, temperature,
+        grocery_context, grocery_nutrients,
     )
-    content = resp.choices[0].message.content or "{}"
+    key = _plan_cache_key(request)
+    if key is None:
+        resp = await get_async_openai_client().chat.completions.create(**request)
+        return parse_plan_response(resp.choices[0].message.content or "{}")
 
+    content = _PLAN_CACHE.get(key)
+    if content is None:
+        pending = _PLAN_INFLIGHT.get(key)
+        if pending is not None:
+            # None means the leading call failed; fall through and try ourselves
+            content = await asyncio.shield(pending)
+    if content is None:
+        content = await _complete_and_cache_async(request, key)
+    return parse_plan_response(content)
+
+async def _complete_and_cache_async(request: Dict[str, Any], key: str) -> str:
+    fut = asyncio.get_running_loop().create_future()
+    _PLAN_INFLIGHT[key] = fut
+    content = None
     try:
-        logger.info("🧩 [LLM PLANNER] --- Raw LLM response ---")
-        logger.info(content)
-    except Exception:
-        pass
+        resp = await get_async_openai_client().chat.completions.create(**request)
+        content = resp.choices[0].message.content or "{}"
+        _PLAN_CACHE.set(key, content)
+        return content
+    finally:
+        if _PLAN_INFLIGHT.get(key) is fut:
+            del _PLAN_INFLIGHT[key]
+        fut.set_result(content)
+
+async def plan_many_async(
+    users: List[UserProfile],
+    concurrency: Optional[int] = None,
+    **kwargs,
+) -> List[Dict[str, Any]]:
+    """
+    Plan several users concurrently with plan_with_llm_async, at most
+    `concurrency` completions in flight. Results are in the order of `users`.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency or LLM_PLANNER_CONCURRENCY))
+
+    async def _one(user: UserProfile) -> Dict[str, Any]:
+        async with sem:
+            return await plan_with_llm_async(user, **kwargs)
+
+    return await asyncio.gather(*(_one(u) for u in users))
+
+def _batch_completion_request(
+    batch: List[UserProfile],
+    model: str,
+    max_supps: int,
+    max_groceries: int,
+    max_recipes: int,
+    temperature: float,
+    grocery_contexts: Optional[Dict[str, List[Dict[str, Any]]]],
+    compact_users: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "messages": _build_batch_messages(
+            batch, max_supps, max_groceries, max_recipes, grocery_contexts, compact_users,
+        ),
+        "temperature": temperature,
+        "max_tokens": PLAN_MAX_TOKENS * len(batch),
+        "response_format": BATCH_PLAN_RESPONSE_FORMAT,
+        "prompt_cache_key": PLAN_PROMPT_CACHE_KEY,
+    }
+
+def _collect_batch_plans(content: str, batch: List[UserProfile], plans: Dict[str, Dict[str, Any]]) -> None:
+    data = _coerce_json(content or "{}")
+    wanted = {u.user_id for u in batch}
+    for plan in data.get("plans") or []:
+        uid = plan.get("user_id") if isinstance(plan, dict) else None
+        if uid in wanted:
+            plans[uid] = _fill_plan_defaults(plan)
+
+def plan_with_llm_batch(
+    users: List[UserProfile],
+    model: Optional[str] = None,
+    max_supps: int = 6,
+    max_groceries: int = 10,
+    max_recipes: int = 3,
+    temperature: float = 0.0,
+    grocery_contexts: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    batch_size: Optional[int] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Plan several users with one completion per batch instead of one per user,
+    for offline/bulk callers. grocery_contexts is keyed by user_id.
+    Returns {user_id: plan}, each plan shaped like plan_with_llm's result;
+    users the model skipped are absent.
+    """
+    model = _planner_model(model)
+    client = get_openai_client()
+    size = max(1, batch_size or LLM_PLANNER_BATCH_SIZE)
+
+    plans: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(users), size):
+        batch = users[start:start + size]
+        resp = client.chat.completions.create(**_batch_completion_request(
+            batch, model, max_supps, max_groceries, max_recipes, temperature, grocery_contexts,
+        ))
+        _collect_batch_plans(resp.choices[0].message.content, batch, plans)
+    return plans
+
+async def plan_with_llm_batch_async(
+    users: List[UserProfile],
+    model: Optional[str] = None,
+    max_supps: int = 6,
+    max_groceries: int = 10,
+    max_recipes: int = 3,
+    temperature: float = 0.0,
+    grocery_contexts: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    batch_size: Optional[int] = None,
+    compact_users: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Same as plan_with_llm_batch, with the batches' completions awaited
+    concurrently. compact_users (keyed by user_id) lets callers that already
+    built a user's _compact_user payload skip rebuilding it.
+    """
+    model = _planner_model(model)
+    client = get_async_openai_client()
+    size = max(1, batch_size or LLM_PLANNER_BATCH_SIZE)
+    batches = [users[start:start + size] for start in range(0, len(users), size)]
+
+    responses = await asyncio.gather(*(
+        client.chat.completions.create(**_batch_completion_request(
+            batch, model, max_supps, max_groceries, max_recipes, temperature, grocery_contexts,
+            compact_users,
+        ))
+        for batch in batches
+    ))
+    plans: Dict[str, Dict[str, Any]] = {}
+    for batch, resp in zip(batches, responses):
+        _collect_batch_plans(resp.choices[0].message.content, batch, plans)
+    return plans
+
+def stream_plan_with_llm(
+    user: UserProfile,
+    model: Optional[str] = None,
+    max_supps: int = 6,
+    max_groceries: int = 10,
+    max_recipes: int = 3,
+    temperature: float = 0.0,
+    grocery_context: Optional[List[Dict[str, Any]]] = None,
+    grocery_nutrients: Optional[Dict[str, float]] = None,
+    **kwargs,
+) -> Iterator[str]:
+    """
+    Same prompt as plan_with_llm, but streams the completion and yields the raw
+    text deltas as they arrive. Join them and pass to parse_plan_response.
+    """
+    client = get_openai_client()
+    stream = client.chat.completions.create(
+        **_completion_request(
+            user, model, max_supps, max_groceries, max_recipes, temperature,
+            grocery_context, grocery_nutrients,
+        ),
+        stream=True,
+    )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+async def stream_plan_with_llm_async(
+    user: UserProfile,
+    model: Optional[str] = None,
+    max_supps: int = 6,
+    max_groceries: int = 10,
+    max_recipes: int = 3,
+    temperature: float = 0.0,
+    grocery_context: Optional[List[Dict[str, Any]]] = None,
+    grocery_nutrients: Optional[Dict[str, float]] = None,
+    **kwargs,
+) -> AsyncIterator[str]:
+    """
+    Same as stream_plan_with_llm, but reads the stream on the shared
+    AsyncOpenAI client so no threadpool worker is held for its duration.
+    """
+    stream = await get_async_openai_client().chat.completions.create(
+        **_completion_request(
+            user, model, max_supps, max_groceries, max_recipes, temperature,
+            grocery_context, grocery_nutrients,
+        ),
+        stream=True,
+    )
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+_RECS_ARRAY_START = re.compile(r'"recommendations"\s*:\s*\[')
+
+class StreamingRecommendationParser:
+    """
+    Feed streamed planner output in; get each supplement object of the
+    top-level "recommendations" array back as soon as its closing brace
+    arrives, so callers can surface items before the full reply is done.
+    """
 
-    data = _coerce_json(content)
+    def __init__(self) -> None:
+        self._buf = ""
+        self._pos = -1          # scan position; -1 until the array is found
+        self._depth = 0
+        self._item_start = 0
+        self._in_string = False
+        self._escaped = False
+        self._done = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        if self._done:
+            return []
+        self._buf += text
+        if self._pos < 0:
+            m = _RECS_ARRAY_START.search(self._buf)
+            if not m:
+                return []
+            self._pos = m.end()
+
+        items: List[Dict[str, Any]] = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # closing bracket of the recommendations array itself
+                    self._done = True
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        item = orjson.loads(buf[self._item_start:i + 1])
+                    except ValueError:
+                        continue
+                    if isinstance(item, dict):
+                        items.append(item)
+        self._pos = len(buf)
+        return items
+
+def _fill_plan_defaults(data: Dict[str, Any]) -> Dict[str, Any]:
     data.setdefault("recommendations", [])
     data.setdefault("grocery_recommendations", [])
     data.setdefault("recipes", [])
     data.setdefault("rebalance_timeframe", "")
+    return data
 
-    try:
-        logger.info("✅ [LLM PLANNER] --- Parsed LLM output summary ---")
-        logger.info(json.dumps({
-            "num_supplements": len(data["recommendations"]),
-            "num_groceries": len(data["grocery_recommendations"]),
-            "num_recipes": len(data["recipes"]),
-            "rebalance_timeframe": data["rebalance_timeframe"],
-        }, indent=2))
-    except Exception:
-        pass
+def parse_plan_response(content: str) -> Dict[str, Any]:
+    """Parse the planner's raw JSON reply and fill in any missing top-level keys."""
+    logger.debug("🧩 [LLM PLANNER] --- Raw LLM response ---\n%s", content)
+
+    data = _fill_plan_defaults(_coerce_json(content))
+
+    logger.info(
+        "✅ [LLM PLANNER] parsed supplements=%d groceries=%d recipes=%d timeframe=%r",
+        len(data["recommendations"]),
+        len(data["grocery_recommendations"]),
+        len(data["recipes"]),
+        data["rebalance_timeframe"],
+    )
 
     return data
\ No newline at end of file
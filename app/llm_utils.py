@@ -1,87 +1,108 @@
-def parse_bloodtest_text(raw_text: str, source_type: str = "auto"):
-    """
-    Parses raw blood test data from various sources.
+import hashlib
+import re
+from typing import List, Optional, Tuple
 
-    Args:
-        raw_text (str): The raw input text, from OCR, JSON, Excel, etc.
-        source_type (str): One of 'image', 'excel', or 'auto'.
+import orjson
+
+from app.cache_utils import TTLCache
+from app.openai_utils import get_async_openai_client, get_openai_client
+
+# OCR of the same lab report is near-identical across uploads, so GPT parses
+# are cached on whitespace/case-normalized text to skip repeat LLM round-trips.
+_GPT_PARSE_CACHE = TTLCache(maxsize=512, ttl=7 * 86400)
+_WHITESPACE_RE = re.compile(r"\s+")
+_FENCE_PREFIX = re.compile(r"^```(?:json)?\n?")
+_FENCE_SUFFIX = re.compile(r"\n```$")
+
+
+def _gpt_cache_key(raw_text: str) -> str:
+    norm = _WHITESPACE_RE.sub(" ", raw_text.lower()).strip()
+    return "btparse:" + hashlib.blake2b(norm.encode(), digest_size=16).hexdigest()
 
-    Behavior:
-    - 'image': allow GPT fallback (for OCR from PDF/PNG/JPG)
-    - 'excel': disable GPT fallback
-    - 'auto': decide based on content
-    """
-    import json
-    import re
-    from openai import OpenAI
 
-    client = OpenAI()
+def _dedupe_results(items: list) -> list:
+    """Drop repeated rows (e.g. a results block OCR'd on two pages), keeping first-seen order."""
+    seen = set()
+    out = []
+    for entry in items:
+        if isinstance(entry, dict):
+            # Only exact duplicates: rows differing in any field (qualifier,
+            # a non-numeric value, ...) are distinct results
+            key = orjson.dumps(entry, option=orjson.OPT_SORT_KEYS)
+            if key in seen:
+                continue
+            seen.add(key)
+        out.append(entry)
+    return out
 
-    def try_parse_json(text):
-        if isinstance(text, str):
-            text = text.strip()
+
+# First characters of the JSON values worth unwrapping: objects, arrays and
+# double-encoded strings
+_JSON_STARTS = ("{", "[", '"')
+
+
+def _unwrap(data):
+    """
+    Peel code fences, JSON-encoded strings and single-item lists off `data`
+    until it is a list of dicts or can't be unwrapped further. Text that can't
+    be JSON (e.g. OCR output) is returned without attempting a parse.
+    """
+    for _ in range(10):
+        if isinstance(data, str):
+            text = data.strip()
             if text.startswith("```"):
-                text = re.sub(r"^```(?:json)?\n?", "", text)
-                text = re.sub(r"\n```$", "", text)
+                text = _FENCE_SUFFIX.sub("", _FENCE_PREFIX.sub("", text))
+            if text[:1] not in _JSON_STARTS:
+                break
             try:
-                return json.loads(text)
+                data = orjson.loads(text)
             except Exception:
-                return text
-        return text
-
-    def unwrap(data):
-        attempts = 0
-        while attempts < 10:
-            if isinstance(data, str):
-                try:
-                    data = json.loads(data)
-                except Exception:
-                    break
-            elif isinstance(data, list):
-                if all(isinstance(item, dict) for item in data):
-                    return data
-                elif len(data) == 1:
-                    data = data[0]
-                else:
-                    break
+                break
+        elif isinstance(data, list):
+            if all(isinstance(item, dict) for item in data):
+                return data
+            elif len(data) == 1:
+                data = data[0]
             else:
                 break
-            attempts += 1
-        return data
-
-    def is_structured_bloodtest(data):
-        if not isinstance(data, list):
-            return False
-        keys = {"marker", "value", "date"}
-        return all(isinstance(item, dict) and keys.issubset(item.keys()) for item in data)
-
-    def coerce_values(data):
-        """Convert value fields to float where possible. Capture < / > qualifiers."""
-        for item in data:
-            val = item.get("value")
+        else:
+            break
+    return data
+
+
+def _is_structured_bloodtest(data):
+    if not isinstance(data, list):
+        return False
+    keys = {"marker", "value", "date"}
+    return all(isinstance(item, dict) and keys.issubset(item.keys()) for item in data)
+
+
+def _clean_rows(data):
+    """
+    Convert value fields to float where possible, capturing < / > qualifiers,
+    and move a trailing "(unit)" out of the marker name into `unit`.
+    One pass over the rows, updating them in place.
+    """
+    for item in data:
+        val = item.get("value")
+        if isinstance(val, str):
+            val = val.strip()
             qualifier = None
+            # Check for inequality
+            if val[:1] in ("<", ">"):
+                qualifier = val[0]
+                val = val[1:].strip()
+
+            try:
+                item["value"] = float(val.replace(",", "."))
+                if qualifier:
+                    item["qualifier"] = qualifier
+            except Exception:
+                item["value"] = None
 
-            if isinstance(val, str):
-                val = val.strip()
-                # Check for inequality
-                if val.startswith("<") or val.startswith(">"):
-                    qualifier = val[0]
-                    val = val[1:].strip()
-
-                try:
-                    item["value"] = float(val.replace(",", "."))
-                    if qualifier:
-                        item["qualifier"] = qualifier
-                except Exception:
-                    item["value"] = None
-
-        return data
-
-    def extract_unit_from_marker(data):
-        cleaned = []
-        for item in data:
-            marker = item.get("marker", "").strip()
-            unit = None
+        marker = item.get("marker", "").strip()
+        # Most markers carry no unit; skip the index scans for those
+        if "(" in marker:
             last_space_idx = marker.rfind(" ")
             if last_space_idx != -1:
                 open_paren_idx = marker.find("(", last_space_idx)
@@ -89,37 +110,55 @@ def parse_bloodtest_text(raw_text: str, source_type: str = "auto"):
                 if 0 <= open_paren_idx < close_paren_idx:
                     unit = marker[open_paren_idx + 1:close_paren_idx].strip()
                     marker = marker[:open_paren_idx].strip()
-            item["marker"] = marker
-            if unit:
-                item["unit"] = unit
-            cleaned.append(item)
-        return cleaned
+                    if unit:
+                        item["unit"] = unit
+        item["marker"] = marker
+    return data
+
+
+def _gpt_result(raw_text: str, structured) -> dict:
+    return {
+        "structured_bloodtest": {
+            "parsed_text": structured if isinstance(structured, list) else [structured]
+        },
+        "raw_text": raw_text,
+        "message": "Blood test data extracted via GPT fallback."
+    }
+
+
+def _prepare_bloodtest(raw_text: str, source_type: str) -> Tuple[Optional[dict], Optional[List[dict]]]:
+    """
+    Everything parse_bloodtest_text does short of calling GPT.
+    Returns (result, None) when the text was resolved locally or from the
+    parse cache, otherwise (None, messages) for the GPT fallback request.
+    """
+    # raw_text is probed as JSON once; steps 1-3 all reuse the outcome rather
+    # than re-parsing (and re-failing on) a large OCR string
+    try:
+        loaded = orjson.loads(raw_text)
+        is_json = True
+    except Exception:
+        loaded = None
+        is_json = False
 
     # Step 1: Try structured JSON handling
-    parsed = try_parse_json(raw_text)
-    parsed = unwrap(parsed)
+    parsed = _unwrap(loaded if is_json else raw_text)
 
-    if is_structured_bloodtest(parsed):
-        structured = coerce_values(parsed)
-        structured = extract_unit_from_marker(structured)
+    if _is_structured_bloodtest(parsed):
+        structured = _clean_rows(parsed)
         return {
             "structured_bloodtest": {
                 "parsed_text": structured
             },
             "raw_text": raw_text,
             "message": "Parsed from structured input (cleaned)"
-        }
+        }, None
 
     # Step 2: Decide whether to use GPT fallback
     should_use_gpt = source_type == "image"
 
     if source_type == "auto":
-        try:
-            test = json.loads(raw_text)
-            if isinstance(test, (list, dict)):
-                should_use_gpt = False
-        except Exception:
-            should_use_gpt = True
+        should_use_gpt = not is_json
 
     if not should_use_gpt:
         return {
@@ -128,16 +167,13 @@ def parse_bloodtest_text(raw_text: str, source_type: str = "auto"):
             },
             "raw_text": raw_text,
             "message": "Unable to parse structured input. GPT fallback is disabled."
-        }
+        }, None
 
-    # Step 3: GPT fallback parsing
-    is_json = False
-    try:
-        json.loads(raw_text)
-        is_json = True
-    except Exception:
-        pass
+    cached = _GPT_PARSE_CACHE.get(_gpt_cache_key(raw_text))
+    if cached is not None:
+        return _gpt_result(raw_text, orjson.loads(cached)), None
 
+    # Step 3: GPT fallback parsing
     prompt = f"""
 You are a helpful assistant extracting blood test results from {'JSON' if is_json else 'OCR'} text.
 
@@ -154,27 +190,54 @@ If the unit is embedded in the marker, such as "Hemoglobin (g/L)", extract "g/L"
 If values are written with symbols like "<0.05", extract the number as value and store "<" in a field named "qualifier".
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "Extract structured blood test data as JSON."},
-            {"role": "user", "content": f"{prompt}\n\nInput:\n{raw_text}"}
-        ],
-        temperature=0,
-        max_tokens=2000,
+    return None, [
+        {"role": "system", "content": "Extract structured blood test data as JSON."},
+        {"role": "user", "content": f"{prompt}\n\nInput:\n{raw_text}"}
+    ]
+
+
+def _finish_gpt_parse(raw_text: str, result_text: str) -> dict:
+    parsed = _unwrap(result_text)
+
+    structured = _clean_rows(parsed)
+    structured = _dedupe_results(structured)
+    _GPT_PARSE_CACHE.set(_gpt_cache_key(raw_text), orjson.dumps(structured))
+    return _gpt_result(raw_text, structured)
+
+
+def parse_bloodtest_text(raw_text: str, source_type: str = "auto"):
+    """
+    Parses raw blood test data from various sources.
+
+    Args:
+        raw_text (str): The raw input text, from OCR, JSON, Excel, etc.
+        source_type (str): One of 'image', 'excel', or 'auto'.
+
+    Behavior:
+    - 'image': allow GPT fallback (for OCR from PDF/PNG/JPG)
+    - 'excel': disable GPT fallback
+    - 'auto': decide based on content
+    """
+    result, messages = _prepare_bloodtest(raw_text, source_type)
+    if result is not None:
+        return result
+
+    response = get_openai_client().chat.completions.create(
+        model="gpt-4o", messages=messages, temperature=0, max_tokens=2000,
     )
+    return _finish_gpt_parse(raw_text, response.choices[0].message.content)
 
-    result_text = response.choices[0].message.content.strip()
-    parsed = try_parse_json(result_text)
-    parsed = unwrap(parsed)
 
-    structured = coerce_values(parsed)
-    structured = extract_unit_from_marker(structured)
+async def parse_bloodtest_text_async(raw_text: str, source_type: str = "auto"):
+    """
+    Same as parse_bloodtest_text, but awaits the GPT fallback on the shared
+    AsyncOpenAI client instead of blocking a worker thread for it.
+    """
+    result, messages = _prepare_bloodtest(raw_text, source_type)
+    if result is not None:
+        return result
 
-    return {
-        "structured_bloodtest": {
-            "parsed_text": structured if isinstance(structured, list) else [structured]
-        },
-        "raw_text": raw_text,
-        "message": "Blood test data extracted via GPT fallback."
-    }
\ No newline at end of file
+    response = await get_async_openai_client().chat.completions.create(
+        model="gpt-4o", messages=messages, temperature=0, max_tokens=2000,
+    )
+    return _finish_gpt_parse(raw_text, response.choices[0].message.content)
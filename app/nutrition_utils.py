@@ -1,34 +1,37 @@
 # app/nutrition_utils.py
 
 import os
-import json
 import re
 from typing import List, Dict, Any, Tuple, Optional
 
-from openai import OpenAI
+import orjson
 
-client = OpenAI()  # Picks up OPENAI_API_KEY from environment
+from app.openai_utils import get_openai_client
 
 
 # ----------------------------
 # Helpers
 # ----------------------------
 
+_FENCE_PREFIX = re.compile(r"^```(?:json)?\s*", re.IGNORECASE)
+_FENCE_SUFFIX = re.compile(r"\s*```$")
+_JSON_ARRAY = re.compile(r"\[[\s\S]*\]")
+
 def _strip_code_fence(text: str) -> str:
     if not isinstance(text, str):
         return text
     t = text.strip()
     if t.startswith("```"):
         # remove leading ```json or ``` and trailing ```
-        t = re.sub(r"^```(?:json)?\s*", "", t, flags=re.IGNORECASE)
-        t = re.sub(r"\s*```$", "", t)
+        t = _FENCE_PREFIX.sub("", t)
+        t = _FENCE_SUFFIX.sub("", t)
     return t
 
 
 def _coerce_json_array(text: str) -> List[Dict[str, Any]]:
     t = _strip_code_fence(text)
     try:
-        data = json.loads(t)
+        data = orjson.loads(t)
         if isinstance(data, list):
             return data
         if isinstance(data, dict) and "items" in data and isinstance(data["items"], list):
@@ -36,9 +39,9 @@ def _coerce_json_array(text: str) -> List[Dict[str, Any]]:
         raise ValueError("Response is not a JSON array.")
     except Exception:
         # try to find the first valid JSON array in the text
-        m = re.search(r"\[[\s\S]*\]", t)
+        m = _JSON_ARRAY.search(t)
         if m:
-            return json.loads(m.group(0))
+            return orjson.loads(m.group(0))
         raise
 
 
@@ -178,6 +181,35 @@ def _infer_totals(entry: Dict[str, Any]) -> Dict[str, Any]:
 # LLM categorization (keeps metrics)
 # ----------------------------
 
+# Explicit schema with metrics, serialized once for every prompt
+_CATEGORIZE_SCHEMA_HINT = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "item": {"type": "string", "description": "Original line as seen on receipt"},
+            "clean": {"type": "string", "description": "Clean standardized name (e.g. 'Bananas', 'Salmon')"},
+            "category": {
+                "type": "string",
+                "description": "One of: Protein, Dairy, Vegetables, Fruit, Grains, Snacks, Beverages, Condiments, Other"
+            },
+            "emoji": {"type": "string"},
+            # metrics
+            "quantity": {"type": "number", "description": "Numeric quantity if present, e.g., 750, 2"},
+            "unit": {"type": "string", "description": "Unit paired with quantity, e.g., g, kg, ml, l, oz, lb, count"},
+            "package_count": {"type": "number", "description": "Number of packages if a multipack, e.g., 2 in '2x 500g'"},
+            "package_size_value": {"type": "number", "description": "Size per package, e.g., 500 in '2x 500g'"},
+            "package_size_unit": {"type": "string", "description": "Unit for size per package, e.g., g, ml"},
+            # optional direct totals if the model wants to compute them:
+            "inferred_total_grams": {"type": "number"},
+            "inferred_total_ml": {"type": "number"},
+        },
+        "required": ["item", "clean", "category"]
+    }
+}
+_CATEGORIZE_SCHEMA_HINT_JSON = orjson.dumps(_CATEGORIZE_SCHEMA_HINT).decode()
+
+
 def categorize_items_with_llm(item_list: List[str], store_name: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Uses GPT-4o to categorize grocery items into structured food data with
@@ -191,33 +223,6 @@ def categorize_items_with_llm(item_list: List[str], store_name: Optional[str] =
         )
     }
 
-    # Add explicit schema with metrics
-    schema_hint = {
-        "type": "array",
-        "items": {
-            "type": "object",
-            "properties": {
-                "item": {"type": "string", "description": "Original line as seen on receipt"},
-                "clean": {"type": "string", "description": "Clean standardized name (e.g. 'Bananas', 'Salmon')"},
-                "category": {
-                    "type": "string",
-                    "description": "One of: Protein, Dairy, Vegetables, Fruit, Grains, Snacks, Beverages, Condiments, Other"
-                },
-                "emoji": {"type": "string"},
-                # metrics
-                "quantity": {"type": "number", "description": "Numeric quantity if present, e.g., 750, 2"},
-                "unit": {"type": "string", "description": "Unit paired with quantity, e.g., g, kg, ml, l, oz, lb, count"},
-                "package_count": {"type": "number", "description": "Number of packages if a multipack, e.g., 2 in '2x 500g'"},
-                "package_size_value": {"type": "number", "description": "Size per package, e.g., 500 in '2x 500g'"},
-                "package_size_unit": {"type": "string", "description": "Unit for size per package, e.g., g, ml"},
-                # optional direct totals if the model wants to compute them:
-                "inferred_total_grams": {"type": "number"},
-                "inferred_total_ml": {"type": "number"},
-            },
-            "required": ["item", "clean", "category"]
-        }
-    }
-
     example = (
         '[{"item":"Arla Mjölk 1L","clean":"Milk","category":"Dairy","emoji":"🥛","quantity":1,"unit":"l",'
         '"inferred_total_ml":1000},'
@@ -245,13 +250,13 @@ def categorize_items_with_llm(item_list: List[str], store_name: Optional[str] =
             "- quantity + unit when present (e.g., '1.02' + 'kg', '750' + 'ml', '2' + 'count')\n"
             "- OR package_count + package_size_value + package_size_unit (e.g., '2' + '500' + 'g')\n"
             "- You MAY include inferred_total_grams or inferred_total_ml if you compute them.\n\n"
-            f"schema: {json.dumps(schema_hint)}\n\n"
+            f"schema: {_CATEGORIZE_SCHEMA_HINT_JSON}\n\n"
             f"example: {example}\n"
         )
     }
 
     try:
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o",
             messages=[system_message, user_message],
             temperature=0.2
@@ -280,6 +285,31 @@ def categorize_items_with_llm(item_list: List[str], store_name: Optional[str] =
 # LLM-based nutrient estimation (optional)
 # ----------------------------
 
+_NUTRIENT_SCHEMA_HINT = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "category": {"type": "string"},
+                    "basis_used": {"type": "string", "description": "100g or 100ml or other"},
+                    "weight_grams": {"type": "number"},
+                    "volume_ml": {"type": "number"},
+                    "nutrients": {"type": "object", "additionalProperties": {"type": "number"}}
+                },
+                "required": ["name", "nutrients"]
+            }
+        },
+        "totals": {"type": "object", "additionalProperties": {"type": "number"}}
+    },
+    "required": ["items", "totals"]
+}
+_NUTRIENT_SCHEMA_HINT_JSON = orjson.dumps(_NUTRIENT_SCHEMA_HINT).decode()
+
+
 def estimate_nutrients_with_llm(categorized_items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
     """
     LLM-based nutrient estimation. Sends items + metrics (inferred_total_grams/ml etc.)
@@ -309,28 +339,6 @@ def estimate_nutrients_with_llm(categorized_items: List[Dict[str, Any]]) -> Tupl
             "inferred_total_ml": it.get("inferred_total_ml"),
         })
 
-    schema_hint = {
-        "type": "object",
-        "properties": {
-            "items": {
-                "type": "array",
-                "items": {
-                    "type": "object",
-                    "properties": {
-                        "name": {"type": "string"},
-                        "category": {"type": "string"},
-                        "basis_used": {"type": "string", "description": "100g or 100ml or other"},
-                        "weight_grams": {"type": "number"},
-                        "volume_ml": {"type": "number"},
-                        "nutrients": {"type": "object", "additionalProperties": {"type": "number"}}
-                    },
-                    "required": ["name", "nutrients"]
-                }
-            },
-            "totals": {"type": "object", "additionalProperties": {"type": "number"}}
-        },
-        "required": ["items", "totals"]
-    }
 
     user_message = {
         "role": "user",
@@ -339,20 +347,20 @@ def estimate_nutrients_with_llm(categorized_items: List[Dict[str, Any]]) -> Tupl
             "Prefer scaling by provided grams or ml. If both are missing, make a reasonable default assumption. "
             "Focus on common nutrients (Protein, Fiber, Omega-3, Calcium, Iron, Magnesium, Vitamin D, Vitamin C, etc.). "
             "Return ONLY JSON matching the schema.\n\n"
-            f"schema: {json.dumps(schema_hint)}\n\n"
-            f"items: {json.dumps(minimal_items)}\n"
+            f"schema: {_NUTRIENT_SCHEMA_HINT_JSON}\n\n"
+            f"items: {orjson.dumps(minimal_items).decode()}\n"
         )
     }
 
     try:
-        resp = client.chat.completions.create(
+        resp = get_openai_client().chat.completions.create(
             model="gpt-4o",
             messages=[system_message, user_message],
             temperature=0.2,
             max_tokens=1200,
         )
         content = resp.choices[0].message.content or "{}"
-        data = json.loads(_strip_code_fence(content))
+        data = orjson.loads(_strip_code_fence(content))
 
         detailed = []
         for it in data.get("items", []):
@@ -0,0 +1,58 @@
+# app/openai_utils.py
+
+import functools
+import os
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+
+def _http_options() -> dict:
+    # HTTP/2 multiplexes concurrent completions over one TLS connection; the
+    # keep-alive pool matches the connection cap so warm connections aren't dropped.
+    return {
+        "http2": True,
+        "timeout": OPENAI_TIMEOUT,
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+        ),
+    }
+
+
+@functools.lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """
+    Shared OpenAI client, built once per process on first use.
+    Its HTTP connection pool is thread-safe, so LLM calls reuse warm connections
+    instead of paying for a new client and TLS handshake on every request.
+    """
+    # Picks up OPENAI_API_KEY from environment
+    return OpenAI(http_client=httpx.Client(**_http_options()))
+
+
+@functools.lru_cache(maxsize=1)
+def get_async_openai_client() -> AsyncOpenAI:
+    """
+    Async counterpart of get_openai_client for code running on the event loop,
+    so awaiting a completion doesn't tie up a threadpool worker.
+    """
+    return AsyncOpenAI(http_client=httpx.AsyncClient(**_http_options()))
+
+
+# Startup warm-up is best effort: a short timeout and no retries keep a slow
+# or unreachable API from holding a worker's startup past its health check.
+WARMUP_TIMEOUT = float(os.getenv("OPENAI_WARMUP_TIMEOUT", "2"))
+
+
+def warm_openai_client() -> None:
+    """Pay the TLS + HTTP/2 handshake up front with a cheap models.list call."""
+    # with_options shares the client's connection pool, so the warm connection is kept
+    get_openai_client().with_options(timeout=WARMUP_TIMEOUT, max_retries=0).models.list()
+
+
+async def warm_async_openai_client() -> None:
+    await get_async_openai_client().with_options(timeout=WARMUP_TIMEOUT, max_retries=0).models.list()
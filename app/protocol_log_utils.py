@@ -2,7 +2,7 @@ from pathlib import Path
 import json
 from typing import List, Dict, Any
 
-PROTOCOL_CHANGE_LOG_FILE = "protocol_change_log.json"
+from app.cluster_logger import PROTOCOL_CHANGE_LOG_FILE, read_jsonl
 
 def validate_protocol_log(log_data: List[Dict[str, Any]]) -> bool:
     required_fields = {"cluster_id", "timestamp", "added", "removed", "modified"}
@@ -41,12 +41,11 @@ def summarize_protocol_changes(log_data: List[Dict[str, Any]]) -> None:
         print(f" Cluster {cid}: Added={changes['added']}, Removed={changes['removed']}, Modified={changes['modified']}")
 
 def main():
-    try:
-        with open(PROTOCOL_CHANGE_LOG_FILE, "r") as f:
-            data = json.load(f)
-    except FileNotFoundError:
+    if not PROTOCOL_CHANGE_LOG_FILE.exists():
         print(f"{PROTOCOL_CHANGE_LOG_FILE} not found.")
         return
+    try:
+        data = read_jsonl(PROTOCOL_CHANGE_LOG_FILE)
     except json.JSONDecodeError as e:
         print(f"JSON decode error: {e}")
         return
@@ -1,39 +1,27 @@
 # app/receipt_ocr.py
 
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import os
 import io
-import json
-import re
-from typing import List, Tuple, Optional
+import tempfile
+from typing import Any, Dict, List, Tuple, Optional
 
 from google.cloud import vision
-from google.oauth2 import service_account
-from pdf2image import convert_from_bytes
-
-# Optional: try to use PDF text layer first
-try:
-    from pdfminer.high_level import extract_text as pdf_extract_text
-except ImportError:
-    pdf_extract_text = None
 
 from app.nutrition_utils import categorize_items_with_llm, estimate_nutrients
+from app.vision_utils import get_vision_client
 
 router = APIRouter()
 
-# -----------------------------
-# Google Vision client
-# -----------------------------
-# Load Google credentials from environment variable (JSON string)
-creds_json = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
-if creds_json:
-    creds_info = json.loads(creds_json)
-    credentials = service_account.Credentials.from_service_account_info(creds_info)
-else:
-    credentials = None
+# Cap on Vision calls in flight across all receipt requests, to stay inside quota
+_OCR_SLOTS = asyncio.Semaphore(int(os.getenv("VISION_OCR_CONCURRENCY", "8")))
 
-# Create Vision client with credentials (works with None if ADC configured)
-vision_client = vision.ImageAnnotatorClient(credentials=credentials)
+# Long receipts are categorized in concurrent batches of at most this many lines;
+# the semaphore caps LLM calls in flight to respect the OpenAI rate limit.
+RECEIPT_LLM_BATCH_SIZE = int(os.getenv("RECEIPT_LLM_BATCH_SIZE", "40"))
+_LLM_SLOTS = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "4")))
 
 # -----------------------------
 # Helpers
@@ -42,7 +30,7 @@ vision_client = vision.ImageAnnotatorClient(credentials=credentials)
 def _ocr_image_bytes(img_bytes: bytes) -> str:
     """OCR one image with Google Vision."""
     image = vision.Image(content=img_bytes)
-    resp = vision_client.text_detection(image=image)
+    resp = get_vision_client().text_detection(image=image)
     if resp.error and resp.error.message:
         # Avoid raising a hard error; return empty so caller can decide fallback
         return ""
@@ -50,18 +38,22 @@ def _ocr_image_bytes(img_bytes: bytes) -> str:
         return resp.text_annotations[0].description or ""
     return ""
 
-def _ocr_images_with_vision(image_bytes_list: List[bytes]) -> str:
-    """OCR multiple images and concatenate text."""
-    texts = []
-    for b in image_bytes_list:
-        txt = _ocr_image_bytes(b)
-        if txt:
-            texts.append(txt)
-    return "\n".join(texts).strip()
+async def _ocr_images_with_vision(image_bytes_list: List[bytes]) -> str:
+    """OCR multiple images concurrently and concatenate text in page order."""
+    async def ocr_one(img_bytes: bytes) -> str:
+        async with _OCR_SLOTS:
+            return await run_in_threadpool(_ocr_image_bytes, img_bytes)
+
+    texts = await asyncio.gather(*(ocr_one(b) for b in image_bytes_list))
+    return "\n".join(t for t in texts if t).strip()
 
 def _extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
     """Extract embedded text from PDF if pdfminer.six is available."""
-    if pdf_extract_text is None:
+    # pdfminer and pdf2image are only imported once a PDF receipt arrives, so
+    # they don't add to every worker's startup time and memory.
+    try:
+        from pdfminer.high_level import extract_text as pdf_extract_text
+    except ImportError:
         return ""
     try:
         return (pdf_extract_text(io.BytesIO(pdf_bytes)) or "").strip()
@@ -69,29 +61,59 @@ def _extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
         return ""
 
 def _pdf_to_image_bytes_list(pdf_bytes: bytes, dpi: int = 300) -> List[bytes]:
-    """Convert all pages of a PDF to PNG bytes."""
-    images = convert_from_bytes(pdf_bytes, dpi=dpi)
-    out = []
-    for img in images:
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        out.append(buf.getvalue())
+    """Convert all pages of a PDF to JPEG bytes."""
+    from pdf2image import convert_from_bytes
+
+    # pdftocairo writes the JPEGs itself (one thread per page), so there's no
+    # PIL decode + PNG re-encode round trip before the bytes go to Vision.
+    with tempfile.TemporaryDirectory() as output_folder:
+        paths = convert_from_bytes(
+            pdf_bytes,
+            dpi=dpi,
+            fmt="jpeg",
+            jpegopt={"quality": 85, "optimize": True},
+            output_folder=output_folder,
+            paths_only=True,
+            thread_count=os.cpu_count() or 1,
+            use_pdftocairo=True,
+        )
+        out = []
+        for path in paths:
+            with open(path, "rb") as f:
+                out.append(f.read())
     return out
 
+_DROP_TOKENS = ("total", "subtotal", "moms", "vat", "tax", "summa", "sum", "change", "cash", "card")
+_PRICE_CHARS = "0123456789.,"
+_CURRENCY_SUFFIXES = ("kr", "usd", "eur", "sek")
+
+def _is_price_line(low: str) -> bool:
+    """
+    True for price-only lines like "12,50", "3.4 kr" or "99 SEK" (input lowercased).
+    Plain str scans instead of a regex: str.strip(chars) runs in C, and most
+    item lines fail on the first character.
+    """
+    s = low.strip()
+    if not s or s[0] not in _PRICE_CHARS:
+        return False
+    if s.endswith(_CURRENCY_SUFFIXES):
+        for suffix in _CURRENCY_SUFFIXES:
+            if s.endswith(suffix):
+                s = s[: -len(suffix)].rstrip()
+                break
+    return not s.strip(_PRICE_CHARS)
+
 def _basic_line_filter(lines: List[str]) -> List[str]:
     """
     Keep likely item lines. Drop totals/tax headers and obvious price-only lines.
     This is intentionally conservative; the LLM categorizer can handle noise.
     """
-    drop_tokens = ("total", "subtotal", "moms", "vat", "tax", "summa", "sum", "change", "cash", "card")
-    price_line = re.compile(r"^\s*[\d\.,]+\s*(kr|usd|eur|sek|$)?\s*$", re.IGNORECASE)
-
     kept = []
     for ln in lines:
         low = ln.lower()
-        if any(tok in low for tok in drop_tokens):
+        if any(tok in low for tok in _DROP_TOKENS):
             continue
-        if price_line.match(ln):
+        if _is_price_line(low):
             continue
         # very short junk lines
         if len(ln.strip()) < 2:
@@ -99,6 +121,25 @@ def _basic_line_filter(lines: List[str]) -> List[str]:
         kept.append(ln.strip())
     return kept
 
+async def _categorize_items(items: List[str]) -> List[Dict[str, Any]]:
+    """
+    LLM-categorize receipt lines, keeping their order. Completion time grows with
+    the number of entries the model writes, so long receipts are split into
+    batches that run concurrently instead of one long call.
+    """
+    # Pack lines into as few calls as the cap allows, sized evenly: each call has a
+    # fixed overhead, so 41 lines go as 21 + 20 rather than 40 + a 1-line call.
+    n_batches = -(-len(items) // RECEIPT_LLM_BATCH_SIZE)
+    size = -(-len(items) // n_batches) if n_batches else 0
+    batches = [items[i:i + size] for i in range(0, len(items), size)] if size else []
+
+    async def categorize(batch: List[str]) -> List[Dict[str, Any]]:
+        async with _LLM_SLOTS:
+            return await run_in_threadpool(categorize_items_with_llm, batch)
+
+    results = await asyncio.gather(*(categorize(b) for b in batches))
+    return [entry for batch in results for entry in batch]
+
 # -----------------------------
 # Endpoint
 # -----------------------------
@@ -131,20 +172,20 @@ async def process_receipt(file: UploadFile = File(...)):
 
     if file_ext == "pdf":
         # 1) Try embedded PDF text
-        text = _extract_text_from_pdf_bytes(content)
+        text = await run_in_threadpool(_extract_text_from_pdf_bytes, content)
         if text:
             source = "pdf_text"
         else:
             # 2) Fallback to OCR for all pages
             try:
-                img_bytes_list = _pdf_to_image_bytes_list(content, dpi=ocr_dpi)
+                img_bytes_list = await run_in_threadpool(_pdf_to_image_bytes_list, content, ocr_dpi)
             except Exception:
                 raise HTTPException(status_code=500, detail="Failed to render PDF pages for OCR.")
-            text = _ocr_images_with_vision(img_bytes_list)
+            text = await _ocr_images_with_vision(img_bytes_list)
             source = "ocr_pdf_pages"
     else:
         # Assume image -> OCR
-        text = _ocr_images_with_vision([content])
+        text = await _ocr_images_with_vision([content])
         source = "ocr_image"
 
     text = (text or "").strip()
@@ -170,13 +211,13 @@ async def process_receipt(file: UploadFile = File(...)):
 
     # --- LLM categorize + nutrient estimation ---
     try:
-        categorized = categorize_items_with_llm(candidate_items)
+        categorized = await _categorize_items(candidate_items)
     except Exception as e:
         # Keep raw text to aid debugging
         raise HTTPException(status_code=502, detail=f"LLM categorization failed: {e}")
 
     try:
-        consumed_foods, dietary_intake = estimate_nutrients(categorized)
+        consumed_foods, dietary_intake = await run_in_threadpool(estimate_nutrients, categorized)
     except Exception as e:
         # Still return categorized items if nutrient estimation fails
         return {
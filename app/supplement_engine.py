@@ -1,10 +1,18 @@
 # app/supplement_engine.py
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 from collections import defaultdict
 
 from app.data_model import UserProfile
-from app.llm_planner import plan_with_llm
+from app.llm_planner import (
+    plan_with_llm,
+    plan_with_llm_async,
+    stream_plan_with_llm,
+    stream_plan_with_llm_async,
+    parse_plan_response,
+    StreamingRecommendationParser,
+)
+from app import llm_batcher
 
 
 class PlanningError(Exception):
@@ -12,6 +20,13 @@ class PlanningError(Exception):
 
 
 def _coerce_float(x) -> float:
+    # Structured output already gives numbers; only strings/None need the slow path
+    if type(x) is float:
+        return x
+    if type(x) is int:
+        return float(x)
+    if x is None:
+        return 0.0
     try:
         return float(x)
     except Exception:
@@ -99,38 +114,153 @@ def generate_supplement_plan(
             max_supps=6,
             max_groceries=10,
             max_recipes=3,
-            temperature=0.2,
+            temperature=0.0,
             grocery_context=grocery_context,
             grocery_nutrients=grocery_nutrients,
         )
     except Exception as e:
         raise PlanningError(f"LLM planning failed: {e}")
 
-    # Normalize supplements to our familiar output shape
+    return _shape_plan(user, data)
+
+
+async def generate_supplement_plan_async(
+    user: UserProfile,
+    grocery_context: Optional[List[Dict[str, Any]]] = None,
+    grocery_nutrients: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    """
+    Async variant of generate_supplement_plan for the API; same return shape.
+    """
+    try:
+        if llm_batcher.LLM_BATCH_ENABLED:
+            # Same limits as below; the batcher shares one completion across
+            # users arriving in the same window
+            data = await llm_batcher.submit(user, grocery_context, grocery_nutrients)
+        else:
+            data = await plan_with_llm_async(
+                user=user,
+                max_supps=6,
+                max_groceries=10,
+                max_recipes=3,
+                temperature=0.0,
+                grocery_context=grocery_context,
+                grocery_nutrients=grocery_nutrients,
+            )
+    except Exception as e:
+        raise PlanningError(f"LLM planning failed: {e}")
+
+    return _shape_plan(user, data)
+
+
+def _delta_events(
+    delta: str, recs_parser: StreamingRecommendationParser
+) -> Iterator[Dict[str, Any]]:
+    yield {"type": "delta", "content": delta}
+    for item in recs_parser.feed(delta):
+        rec = _shape_recommendation(item)
+        if rec:
+            yield {"type": "recommendation", "recommendation": rec}
+
+
+def stream_supplement_plan(
+    user: UserProfile,
+    grocery_context: Optional[List[Dict[str, Any]]] = None,
+    grocery_nutrients: Optional[Dict[str, float]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of generate_supplement_plan. Yields:
+      - {"type": "delta", "content": str} for each chunk of raw LLM output
+      - {"type": "recommendation", "recommendation": {...}} as soon as each
+        supplement in the reply is complete, normalized like the plan's items
+      - {"type": "plan", "plan": {...}} once at the end, shaped exactly like
+        generate_supplement_plan's return value
+    Raises PlanningError if the LLM call or parsing its reply fails.
+    """
+    parts: List[str] = []
+    recs_parser = StreamingRecommendationParser()
+    try:
+        for delta in stream_plan_with_llm(
+            user=user,
+            max_supps=6,
+            max_groceries=10,
+            max_recipes=3,
+            temperature=0.0,
+            grocery_context=grocery_context,
+            grocery_nutrients=grocery_nutrients,
+        ):
+            parts.append(delta)
+            yield from _delta_events(delta, recs_parser)
+        data = parse_plan_response("".join(parts) or "{}")
+    except Exception as e:
+        raise PlanningError(f"LLM planning failed: {e}")
+
+    yield {"type": "plan", "plan": _shape_plan(user, data)}
+
+
+async def stream_supplement_plan_async(
+    user: UserProfile,
+    grocery_context: Optional[List[Dict[str, Any]]] = None,
+    grocery_nutrients: Optional[Dict[str, float]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Async variant of stream_supplement_plan for the API; same events.
+    """
+    parts: List[str] = []
+    recs_parser = StreamingRecommendationParser()
+    try:
+        async for delta in stream_plan_with_llm_async(
+            user=user,
+            max_supps=6,
+            max_groceries=10,
+            max_recipes=3,
+            temperature=0.0,
+            grocery_context=grocery_context,
+            grocery_nutrients=grocery_nutrients,
+        ):
+            parts.append(delta)
+            for event in _delta_events(delta, recs_parser):
+                yield event
+        data = parse_plan_response("".join(parts) or "{}")
+    except Exception as e:
+        raise PlanningError(f"LLM planning failed: {e}")
+
+    yield {"type": "plan", "plan": _shape_plan(user, data)}
+
+
+def _shape_recommendation(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Normalize one LLM supplement to our familiar output shape
+    get = item.get
+    name = str(get("name", "")).strip()
+    if not name:
+        return None
+    dosage = _coerce_float(get("dosage", 0))
+    unit = str(get("unit", "")).strip()
+    reason = (str(get("reason") or "").strip()) or None
+    triggered_by = get("triggered_by") or []
+    contraindications = get("contraindications") or []
+    inputs_triggered = get("inputs_triggered") or []
+
+    return {
+        "name": name,
+        "dosage": round(dosage, 2),
+        "unit": unit,
+        "reason": reason,
+        "triggered_by": [str(x) for x in triggered_by],
+        "contraindications": [str(x) for x in contraindications],
+        "inputs_triggered": [str(x) for x in inputs_triggered],
+        "source": "llm",
+        "validation_flags": [],
+        "explanation": reason,
+    }
+
+
+def _shape_plan(user: UserProfile, data: Dict[str, Any]) -> Dict[str, Any]:
     out_recs: List[Dict[str, Any]] = []
     for item in data.get("recommendations", []):
-        name = str(item.get("name", "")).strip()
-        if not name:
-            continue
-        dosage = _coerce_float(item.get("dosage", 0))
-        unit = str(item.get("unit", "")).strip()
-        reason = (str(item.get("reason") or "").strip()) or None
-        triggered_by = item.get("triggered_by") or []
-        contraindications = item.get("contraindications") or []
-        inputs_triggered = item.get("inputs_triggered") or []
-
-        out_recs.append({
-            "name": name,
-            "dosage": round(dosage, 2),
-            "unit": unit,
-            "reason": reason,
-            "triggered_by": [str(x) for x in triggered_by],
-            "contraindications": [str(x) for x in contraindications],
-            "inputs_triggered": [str(x) for x in inputs_triggered],
-            "source": "llm",
-            "validation_flags": [],
-            "explanation": reason,
-        })
+        rec = _shape_recommendation(item)
+        if rec:
+            out_recs.append(rec)
 
     grocery_recs = data.get("grocery_recommendations", []) or []
     grocery_by_nutrient = _group_groceries_by_nutrient(grocery_recs)
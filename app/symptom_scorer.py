@@ -2,6 +2,7 @@ from pathlib import Path
 # symptom_scorer.py
 
 from typing import Dict
+import numpy as np
 from app.data_model import UserProfile
 
 # Symptom → Nutrient weighted relevance map
@@ -25,8 +26,9 @@ LIFESTYLE_NUTRIENT_MODIFIERS: Dict[str, Dict[str, float]] = {
     "pregnant": {"Folate (B9)": 0.4, "Iron": 0.3, "Calcium": 0.2, "DHA": 0.3},
 }
 
-# Combine nutrients from both maps to cover all
-ALL_NUTRIENTS = list({
+# Combine nutrients from both maps to cover all. Sorted so the order (and the
+# index of each nutrient in score vectors) is stable across processes.
+ALL_NUTRIENTS = sorted({
     nutrient
     for mapping in SYMPTOM_NUTRIENT_MAP.values()
     for nutrient in mapping
@@ -35,15 +37,24 @@ ALL_NUTRIENTS = list({
     for mapping in LIFESTYLE_NUTRIENT_MODIFIERS.values()
     for nutrient in mapping
 })
+NUTRIENT_INDEX: Dict[str, int] = {nutrient: i for i, nutrient in enumerate(ALL_NUTRIENTS)}
 
-def score_nutrient_needs(user: UserProfile) -> Dict[str, float]:
+def _weight_vector(weights: Dict[str, float]) -> np.ndarray:
+    vec = np.zeros(len(ALL_NUTRIENTS))
+    for nutrient, weight in weights.items():
+        vec[NUTRIENT_INDEX[nutrient]] = weight
+    return vec
+
+# Each map entry as a dense vector, so scoring is array adds instead of dict updates
+_SYMPTOM_VECTORS = {symptom: _weight_vector(m) for symptom, m in SYMPTOM_NUTRIENT_MAP.items()}
+_LIFESTYLE_VECTORS = {lifestyle: _weight_vector(m) for lifestyle, m in LIFESTYLE_NUTRIENT_MODIFIERS.items()}
+
+def score_nutrient_needs_vec(user: UserProfile) -> np.ndarray:
     """
-    Computes a nutrient → need score (0 to 1) based on:
-      - Reported symptoms
-      - Feedback symptoms (if any)
-      - Lifestyle modifiers
+    Nutrient need scores (0 to 1) as an array indexed like ALL_NUTRIENTS.
+    Same scoring as score_nutrient_needs; use this when aggregating many users.
     """
-    scores = {nutrient: 0.0 for nutrient in ALL_NUTRIENTS}
+    scores = np.zeros(len(ALL_NUTRIENTS))
 
     # Combine reported symptoms + feedback symptoms (if present)
     all_symptoms = [s.lower() for s in user.symptoms or []]
@@ -53,9 +64,9 @@ def score_nutrient_needs(user: UserProfile) -> Dict[str, float]:
 
     # Symptom-based scoring
     for symptom in all_symptoms:
-        if symptom in SYMPTOM_NUTRIENT_MAP:
-            for nutrient, weight in SYMPTOM_NUTRIENT_MAP[symptom].items():
-                scores[nutrient] += weight
+        weights = _SYMPTOM_VECTORS.get(symptom)
+        if weights is not None:
+            scores += weights
 
     # Lifestyle can be dict or list; get keys accordingly
     if isinstance(user.lifestyle, dict):
@@ -65,15 +76,21 @@ def score_nutrient_needs(user: UserProfile) -> Dict[str, float]:
 
     # Lifestyle-based adjustments
     for lifestyle in lifestyle_keys:
-        lifestyle_lower = lifestyle.lower()
-        modifiers = LIFESTYLE_NUTRIENT_MODIFIERS.get(lifestyle_lower, {})
-        for nutrient, bump in modifiers.items():
-            scores[nutrient] = scores.get(nutrient, 0.0) + bump
+        modifiers = _LIFESTYLE_VECTORS.get(lifestyle.lower())
+        if modifiers is not None:
+            scores += modifiers
 
     # Normalize scores to 0–1 scale
-    max_score = max(scores.values()) if scores else 1.0
-    for nutrient in scores:
-        normalized = scores[nutrient] / max_score if max_score > 0 else 0.0
-        scores[nutrient] = round(min(normalized, 1.0), 3)
+    max_score = scores.max()
+    if max_score <= 0:
+        return np.zeros(len(ALL_NUTRIENTS))
+    return np.round(np.minimum(scores / max_score, 1.0), 3)
 
-    return scores
\ No newline at end of file
+def score_nutrient_needs(user: UserProfile) -> Dict[str, float]:
+    """
+    Computes a nutrient → need score (0 to 1) based on:
+      - Reported symptoms
+      - Feedback symptoms (if any)
+      - Lifestyle modifiers
+    """
+    return dict(zip(ALL_NUTRIENTS, score_nutrient_needs_vec(user).tolist()))
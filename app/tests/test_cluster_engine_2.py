@@ -1,6 +1,6 @@
 from pathlib import Path
 import unittest
-from app.cluster_engine import ClusterEngine, generate_cluster_protocol
+from app.cluster_engine import ClusterEngine, generate_cluster_protocol, vectorize_user, SYMPTOM_VOCAB, LIFESTYLE_VOCAB, GENDER_VOCAB
 from app.data_model import UserProfile
 
 class TestClusterEngine(unittest.TestCase):
@@ -19,6 +19,8 @@ class TestClusterEngine(unittest.TestCase):
         # Test cluster assignment for a user
         cluster_id = self.cluster_engine.assign_cluster(self.users[0])
         self.assertIn(cluster_id, range(self.cluster_engine.n_clusters))
+        # fit() labels match what assign_cluster predicts for the training users
+        self.assertEqual(self.cluster_engine.labels, [self.cluster_engine.assign_cluster(u) for u in self.users])
 
     def test_generate_cluster_protocol(self):
         protocol = generate_cluster_protocol(self.users)
@@ -36,5 +38,15 @@ class TestClusterEngine(unittest.TestCase):
         self.assertIsInstance(dists, list)
         self.assertEqual(len(dists), self.cluster_engine.n_clusters)
 
+    def test_vectorize_user_layout(self):
+        user = UserProfile(user_id="u4", age=50, gender="male", symptoms=["Fatigue", "unknown"], lifestyle={"Vegan": True, "athlete": False})
+        vec = vectorize_user(user)
+        self.assertEqual(len(vec), 1 + len(GENDER_VOCAB) + len(SYMPTOM_VOCAB) + len(LIFESTYLE_VOCAB))
+        self.assertAlmostEqual(vec[0], 0.5)
+        self.assertEqual(vec[1 + GENDER_VOCAB.index("male")], 1.0)
+        self.assertEqual(vec[1 + len(GENDER_VOCAB) + SYMPTOM_VOCAB.index("fatigue")], 1.0)
+        self.assertEqual(vec[1 + len(GENDER_VOCAB) + len(SYMPTOM_VOCAB) + LIFESTYLE_VOCAB.index("vegan")], 1.0)
+        self.assertEqual(vec.sum(), 0.5 + 3)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,13 @@
+from app import data_storage
+from app.data_model import UserProfile
+
+
+def test_loaded_profiles_do_not_share_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_storage, "USERS_FILE", str(tmp_path / "users.jsonl"))
+    data_storage.save_user(UserProfile(user_id="u1", age=30, gender="female", symptoms=["fatigue"]))
+
+    first = data_storage.load_all_users()[0]
+    first.symptoms.append("INJECTED")
+
+    assert data_storage.load_user("u1").symptoms == ["fatigue"]
+    assert data_storage.load_all_users()[0].symptoms == ["fatigue"]
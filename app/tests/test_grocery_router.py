@@ -0,0 +1,53 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from postgrest.exceptions import APIError
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+from app import grocery_router  # noqa: E402
+
+_ITEMS = {"items": [
+    {"user_id": "u1", "store_name": "Willys", "receipt_data": None, "products": [],
+     "household_size": 2, "eats_at_home": True},
+    {"user_id": "u2", "store_name": None, "receipt_data": None, "products": None,
+     "household_size": None, "eats_at_home": None},
+]}
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(grocery_router.router)
+    return TestClient(app)
+
+
+def _fake_supabase(execute):
+    fake = MagicMock()
+    fake.table.return_value.insert.return_value.execute = execute
+    return fake
+
+
+def test_bulk_insert_sends_one_array(client):
+    fake = _fake_supabase(MagicMock(return_value=MagicMock(data=[{"id": 1}, {"id": 2}])))
+    with patch.object(grocery_router, "supabase", fake):
+        resp = client.post("/grocery/bulk", json=_ITEMS)
+
+    assert resp.status_code == 201
+    assert resp.json() == [{"id": 1}, {"id": 2}]
+    rows = fake.table.return_value.insert.call_args.args[0]
+    assert [r["user_id"] for r in rows] == ["u1", "u2"]
+    assert rows[1] == {"user_id": "u2"}
+
+
+def test_bulk_insert_maps_api_error_to_400(client):
+    fake = _fake_supabase(MagicMock(side_effect=APIError({"message": "null value in column", "code": "23502"})))
+    with patch.object(grocery_router, "supabase", fake):
+        resp = client.post("/grocery/bulk", json=_ITEMS)
+
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "null value in column"
@@ -0,0 +1,73 @@
+import asyncio
+from unittest.mock import patch
+
+from app.data_model import UserProfile
+from app.llm_batcher import PlanBatcher
+
+
+def _user(uid):
+    return UserProfile(user_id=uid, age=30, gender="female", symptoms=["fatigue"])
+
+
+def test_concurrent_submits_share_one_batch_call():
+    batch_calls = []
+
+    async def fake_batch(users, **kwargs):
+        batch_calls.append([u.user_id for u in users])
+        assert set(kwargs["compact_users"]) == {"a", "b", "c"}
+        return {u.user_id: {"user_id": u.user_id} for u in users if u.user_id != "c"}
+
+    async def fake_single(user, **kwargs):
+        return {"user_id": user.user_id, "single": True}
+
+    async def run():
+        batcher = PlanBatcher(window=0.01, max_size=8)
+        return await asyncio.gather(*(batcher.submit(_user(uid)) for uid in "abc"))
+
+    with patch("app.llm_batcher.plan_with_llm_batch_async", fake_batch), \
+         patch("app.llm_batcher.plan_with_llm_async", fake_single):
+        plans = asyncio.run(run())
+
+    assert batch_calls == [["a", "b", "c"]]
+    assert [p["user_id"] for p in plans] == ["a", "b", "c"]
+    # "c" was missing from the batch reply and got its own call
+    assert plans[2].get("single") and not plans[0].get("single")
+
+
+def test_full_window_flushes_without_waiting():
+    batch_calls = []
+
+    async def fake_batch(users, **kwargs):
+        batch_calls.append(len(users))
+        return {u.user_id: {"user_id": u.user_id} for u in users}
+
+    async def run():
+        batcher = PlanBatcher(window=60, max_size=2)
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.submit(_user("a")), batcher.submit(_user("b"))), timeout=1
+        )
+
+    with patch("app.llm_batcher.plan_with_llm_batch_async", fake_batch):
+        asyncio.run(run())
+
+    assert batch_calls == [2]
+
+
+def test_failed_batch_is_logged_and_falls_back(caplog):
+    async def failing_batch(users, **kwargs):
+        raise RuntimeError("response_format rejected")
+
+    async def fake_single(user, **kwargs):
+        return {"user_id": user.user_id}
+
+    async def run():
+        batcher = PlanBatcher(window=0.01)
+        return await asyncio.gather(batcher.submit(_user("a")), batcher.submit(_user("b")))
+
+    with patch("app.llm_batcher.plan_with_llm_batch_async", failing_batch), \
+         patch("app.llm_batcher.plan_with_llm_async", fake_single), \
+         caplog.at_level("WARNING", logger="uvicorn.error"):
+        plans = asyncio.run(run())
+
+    assert [p["user_id"] for p in plans] == ["a", "b"]
+    assert "response_format rejected" in caplog.text
@@ -0,0 +1,153 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import llm_planner
+from app.data_model import UserProfile
+from app.llm_planner import (
+    GROCERY_PROMPT_LIMIT,
+    StreamingRecommendationParser,
+    _grocery_hint,
+    plan_many_async,
+    plan_with_llm,
+    plan_with_llm_async,
+    plan_with_llm_batch,
+)
+from app.user_profile_builder import build_user_profile
+
+
+def _completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _fake_client(content):
+    client = MagicMock()
+    client.chat.completions.create.return_value = _completion(content)
+    return client
+
+
+def _user(user_id="testuser1"):
+    return UserProfile(user_id=user_id, age=30, gender="male", symptoms=["fatigue"])
+
+
+def _frontend_input():
+    # Stand-in for app.api.FrontendUserInput, as in test_user_profile_builder
+    return SimpleNamespace(
+        age=41,
+        biological_sex="female",
+        pregnancy=None,
+        lifestyle={"diet": "vegan"},
+        medical_conditions=["anemia"],
+        health_priorities=["energy"],
+    )
+
+
+@pytest.fixture(autouse=True)
+def _clear_plan_cache():
+    llm_planner._PLAN_CACHE.clear()
+
+
+def test_streaming_recommendation_parser_emits_items_as_they_close():
+    parser = StreamingRecommendationParser()
+    chunks = [
+        '{"rebalance_timeframe": "8 weeks", "recommen',
+        'dations": [{"name": "Iron", "reason": "low {ferritin}", ',
+        '"triggered_by": ["fatigue"]}, {"name": "Zinc \\"x\\""',
+        '}], "recipes": [{"title": "Soup"}]}',
+    ]
+    got = [[item["name"] for item in parser.feed(c)] for c in chunks]
+    assert got == [[], [], ["Iron"], ['Zinc "x"']]
+
+
+def test_plan_with_llm_batch_splits_and_keys_by_user_id():
+    client = _fake_client('{"plans": [{"user_id": "testuser1", "recipes": [{"title": "Soup"}]}, {"user_id": "stranger"}]}')
+    with patch("app.llm_planner.get_openai_client", return_value=client):
+        plans = plan_with_llm_batch([_user(), _user("testuser2")], batch_size=1)
+
+    assert client.chat.completions.create.call_count == 2
+    assert list(plans) == ["testuser1"]
+    assert plans["testuser1"]["recipes"] == [{"title": "Soup"}]
+    assert plans["testuser1"]["recommendations"] == []
+
+
+def test_plan_with_llm_reuses_cached_reply_at_zero_temperature():
+    client = _fake_client('{"recipes": []}')
+    user = _user()
+    with patch("app.llm_planner.get_openai_client", return_value=client):
+        plan_with_llm(user)
+        plan_with_llm(user)
+        plan_with_llm(user, temperature=0.7)
+        plan_with_llm(user, temperature=0.7)
+
+    assert client.chat.completions.create.call_count == 3
+
+
+def test_plan_with_llm_caches_identical_submissions_across_profile_ids():
+    client = _fake_client('{"recipes": []}')
+    user_input = _frontend_input()
+    first, second = build_user_profile(user_input), build_user_profile(user_input)
+    assert first.user_id != second.user_id
+
+    with patch("app.llm_planner.get_openai_client", return_value=client):
+        plan_with_llm(first)
+        plan_with_llm(second)
+
+    assert client.chat.completions.create.call_count == 1
+
+
+def test_grocery_hint_dedupes_and_caps_items():
+    items = [{"name": "Milk", "category": "dairy", "quantity": 1, "unit": None}] * 3
+    items += [{"name": f"item {i}", "category": "misc"} for i in range(GROCERY_PROMPT_LIMIT + 50)]
+
+    hint = _grocery_hint(items)
+
+    assert hint["recent_groceries"][0] == {"name": "Milk", "category": "dairy", "quantity": 1}
+    assert hint["recent_groceries"][1]["name"] == "item 0"
+    assert len(hint["recent_groceries"]) == GROCERY_PROMPT_LIMIT
+    assert hint["recent_grocery_count"] == len(items)
+
+
+def test_plan_many_async_bounds_concurrency_and_keeps_order():
+    in_flight = peak = 0
+
+    async def fake_plan(user, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+        return {"user_id": user.user_id, "max_supps": kwargs["max_supps"]}
+
+    users = [_user(f"u{i}") for i in range(5)]
+    with patch.object(llm_planner, "plan_with_llm_async", fake_plan):
+        plans = asyncio.run(plan_many_async(users, concurrency=2, max_supps=4))
+
+    assert [p["user_id"] for p in plans] == ["u0", "u1", "u2", "u3", "u4"]
+    assert plans[0]["max_supps"] == 4
+    assert peak == 2
+
+
+def test_plan_with_llm_async_shares_in_flight_identical_requests():
+    calls = 0
+
+    async def create(**request):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return _completion('{"recipes": []}')
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    # Each API submit builds its own profile, with its own user_id
+    user_input = _frontend_input()
+
+    async def burst():
+        return await asyncio.gather(*(plan_with_llm_async(build_user_profile(user_input)) for _ in range(3)))
+
+    with patch("app.llm_planner.get_async_openai_client", return_value=client):
+        plans = asyncio.run(burst())
+
+    assert calls == 1
+    assert plans[0] == plans[2]
+    assert not llm_planner._PLAN_INFLIGHT
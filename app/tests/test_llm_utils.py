@@ -0,0 +1,79 @@
+from unittest.mock import MagicMock, patch
+
+from app import llm_utils
+from app.llm_utils import parse_bloodtest_text
+
+
+def _fake_client(content):
+    client = MagicMock()
+    client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content=content))]
+    return client
+
+
+def test_structured_json_input_skips_gpt():
+    raw = '[{"marker": "Ferritin (ug/L)", "value": "<12,5", "date": "2024-01-01"}]'
+    with patch("app.llm_utils.get_openai_client") as get_client:
+        result = parse_bloodtest_text(raw)
+    get_client.assert_not_called()
+    item = result["structured_bloodtest"]["parsed_text"][0]
+    assert item["marker"] == "Ferritin"
+    assert item["unit"] == "ug/L"
+    assert item["value"] == 12.5
+    assert item["qualifier"] == "<"
+
+
+def test_gpt_parse_is_cached_on_normalized_text():
+    llm_utils._GPT_PARSE_CACHE.clear()
+    client = _fake_client('[{"marker": "Hemoglobin", "value": "140", "unit": "g/L", "date": null}]')
+    with patch("app.llm_utils.get_openai_client", return_value=client):
+        first = parse_bloodtest_text("Hemoglobin 140 g/L", source_type="image")
+        second = parse_bloodtest_text("  HEMOGLOBIN   140\ng/L ", source_type="image")
+
+    assert client.chat.completions.create.call_count == 1
+    assert first["structured_bloodtest"] == second["structured_bloodtest"]
+    assert second["raw_text"] == "  HEMOGLOBIN   140\ng/L "
+
+
+def test_gpt_parse_drops_repeated_rows():
+    llm_utils._GPT_PARSE_CACHE.clear()
+    client = _fake_client(
+        '[{"marker": "Ferritin (ug/L)", "value": "45", "date": "2024-01-01"},'
+        ' {"marker": "Ferritin (ug/L)", "value": "45", "date": "2024-01-01"},'
+        ' {"marker": "Ferritin", "value": 45, "unit": "ug/L", "date": "2024-06-01"}]'
+    )
+    with patch("app.llm_utils.get_openai_client", return_value=client):
+        result = parse_bloodtest_text("Ferritin 45 ug/L", source_type="image")
+
+    rows = result["structured_bloodtest"]["parsed_text"]
+    assert [r["date"] for r in rows] == ["2024-01-01", "2024-06-01"]
+
+
+def test_gpt_parse_keeps_rows_that_differ_only_in_qualifier():
+    llm_utils._GPT_PARSE_CACHE.clear()
+    client = _fake_client(
+        '[{"marker": "CRP", "value": "<5", "unit": "mg/L", "date": "2024-01-01"},'
+        ' {"marker": "CRP", "value": "5", "unit": "mg/L", "date": "2024-01-01"},'
+        ' {"marker": "CRP", "value": "5", "unit": "mg/L", "date": ["2024-01-01"]}]'
+    )
+    with patch("app.llm_utils.get_openai_client", return_value=client):
+        result = parse_bloodtest_text("CRP <5 mg/L, CRP 5 mg/L", source_type="image")
+
+    rows = result["structured_bloodtest"]["parsed_text"]
+    assert [r.get("qualifier") for r in rows] == ["<", None, None]
+
+
+def test_async_parse_matches_sync_result():
+    import asyncio
+    from unittest.mock import AsyncMock
+
+    llm_utils._GPT_PARSE_CACHE.clear()
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(return_value=MagicMock(
+        choices=[MagicMock(message=MagicMock(content='[{"marker": "Iron (umol/L)", "value": "15", "date": null}]'))]
+    ))
+    with patch("app.llm_utils.get_async_openai_client", return_value=client):
+        result = asyncio.run(llm_utils.parse_bloodtest_text_async("Iron 15 umol/L", source_type="image"))
+
+    item = result["structured_bloodtest"]["parsed_text"][0]
+    assert (item["marker"], item["unit"], item["value"]) == ("Iron", "umol/L", 15.0)
+    assert result["message"] == "Blood test data extracted via GPT fallback."
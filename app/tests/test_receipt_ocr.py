@@ -0,0 +1,13 @@
+from app.receipt_ocr import _basic_line_filter, _is_price_line
+
+
+def test_price_only_lines_are_detected():
+    for line in ["12,50", "3.4 kr", "  99 SEK ", "5usd"]:
+        assert _is_price_line(line.lower()), line
+    for line in ["kr", "1 2", "Mjölk 1l", "12kr5", "5 kr kr", ""]:
+        assert not _is_price_line(line.lower()), line
+
+
+def test_basic_line_filter_keeps_item_lines():
+    lines = ["Arla Mjölk 1L", "21,90", "Bananer 1.02kg", "TOTAL 45,80", "x", "Moms 12%"]
+    assert _basic_line_filter(lines) == ["Arla Mjölk 1L", "Bananer 1.02kg"]
@@ -1,8 +1,14 @@
 from pathlib import Path
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, patch, MagicMock
 from app.data_model import UserProfile, BloodTestResult, WearableMetrics, SupplementRecommendation
-from app.supplement_engine import generate_supplement_plan
+from app.supplement_engine import (
+    generate_supplement_plan,
+    generate_supplement_plan_async,
+    stream_supplement_plan,
+    stream_supplement_plan_async,
+)
 
 @pytest.fixture
 def mock_user():
@@ -56,5 +62,50 @@ def test_generate_supplement_plan(
     assert recommendations[0].dosage == 2000
     assert recommendations[1].dosage == 400
 
+
+def test_stream_supplement_plan_yields_deltas_then_plan(mock_user):
+    deltas = ['{"recommendations": [{"name": "Vitamin D", ', '"dosage": "2000", "unit": "IU"}]}']
+    with patch("app.supplement_engine.stream_plan_with_llm", return_value=iter(deltas)):
+        events = list(stream_supplement_plan(mock_user))
+
+    assert [e["content"] for e in events if e["type"] == "delta"] == deltas
+    streamed = [e["recommendation"] for e in events if e["type"] == "recommendation"]
+    assert [r["name"] for r in streamed] == ["Vitamin D"]
+    assert events[-1]["type"] == "plan"
+    plan = events[-1]["plan"]
+    assert plan["user_id"] == "testuser1"
+    assert plan["recommendations"][0]["name"] == "Vitamin D"
+    assert plan["recommendations"][0]["dosage"] == 2000.0
+    assert plan["recipes"] == []
+
+
+def test_generate_supplement_plan_async_shapes_plan(mock_user):
+    reply = {"recommendations": [{"name": "Magnesium", "dosage": 200, "unit": "mg"}]}
+    with patch("app.supplement_engine.plan_with_llm_async", AsyncMock(return_value=reply)):
+        plan = asyncio.run(generate_supplement_plan_async(mock_user))
+
+    assert plan["user_id"] == "testuser1"
+    assert plan["recommendations"][0]["name"] == "Magnesium"
+    assert plan["recommendations"][0]["source"] == "llm"
+
+
+def test_stream_supplement_plan_async_matches_sync_events(mock_user):
+    deltas = ['{"recommendations": [{"name": "Zinc", ', '"dosage": 15, "unit": "mg"}]}']
+
+    async def fake_stream(**kwargs):
+        for d in deltas:
+            yield d
+
+    async def collect():
+        return [e async for e in stream_supplement_plan_async(mock_user)]
+
+    with patch("app.supplement_engine.stream_plan_with_llm_async", fake_stream):
+        events = asyncio.run(collect())
+    with patch("app.supplement_engine.stream_plan_with_llm", return_value=iter(deltas)):
+        expected = list(stream_supplement_plan(mock_user))
+
+    assert events == expected
+    assert [e["type"] for e in events] == ["delta", "delta", "recommendation", "plan"]
+
 if __name__ == "__main__":
-    pytest.main()
\ No newline at end of file
+    pytest.main()
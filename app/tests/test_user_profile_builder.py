@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+from app.user_profile_builder import build_user_profile
+
+
+def make_input(**overrides):
+    data = dict(
+        age=None,
+        biological_sex=None,
+        pregnancy=None,
+        lifestyle={},
+        medical_conditions=[],
+        health_priorities=[],
+    )
+    data.update(overrides)
+    return SimpleNamespace(**data)
+
+
+def test_gender_normalization():
+    assert build_user_profile(make_input(biological_sex=" Woman ")).gender == "female"
+    assert build_user_profile(make_input(biological_sex="m")).gender == "male"
+    assert build_user_profile(make_input(biological_sex="non-binary")).gender == "other"
+    assert build_user_profile(make_input(biological_sex="unknown")).gender == "unspecified"
+    assert build_user_profile(make_input()).gender == "unspecified"
+
+
+def test_defaults_and_pregnancy():
+    user = build_user_profile(make_input(pregnancy="Yes", health_priorities=["energy"]))
+    assert user.age == 35
+    assert user.lifestyle["pregnancy"] == "yes"
+    assert user.goals == ["energy"]
+
+
+def test_otc_medications_split_from_conditions():
+    user = build_user_profile(make_input(medical_conditions=["Ibuprofen", "hypothyroidism"]))
+    assert user.medications == ["Ibuprofen"]
+    assert user.medical_conditions == ["hypothyroidism"]
@@ -0,0 +1,49 @@
+import io
+from unittest.mock import MagicMock, patch
+
+from google.api_core.exceptions import InvalidArgument
+
+from app import bloodtest_ocr
+from app.vision_utils import annotate_pdf_inline, pdf_page_count
+
+
+def _pdf(pages):
+    objs = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % (3 + i) for i in range(pages)), pages),
+    ] + [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 10 10] >>"] * pages
+    out, offsets = b"%PDF-1.4\n", []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i + 1, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    return out
+
+
+def test_pdf_page_count_reads_page_tree():
+    upload = io.BytesIO(_pdf(7))
+    assert pdf_page_count(upload) == 7
+    assert upload.tell() == 0
+    assert pdf_page_count(io.BytesIO(b"not a pdf")) is None
+
+
+def test_long_pdf_skips_inline_annotation():
+    with patch("app.bloodtest_ocr.annotate_pdf_inline") as annotate:
+        assert bloodtest_ocr._ocr_pdf_inline(io.BytesIO(_pdf(7))) is None
+    annotate.assert_not_called()
+
+
+def test_short_pdf_is_annotated_inline():
+    with patch("app.bloodtest_ocr.annotate_pdf_inline", return_value=["p1", "p2"]) as annotate:
+        assert bloodtest_ocr._ocr_pdf_inline(io.BytesIO(_pdf(2))) == "p1\np2\n"
+    annotate.assert_called_once()
+
+
+def test_rejected_inline_pdf_falls_back():
+    client = MagicMock()
+    client.batch_annotate_files.side_effect = InvalidArgument("bad pdf")
+    with patch("app.vision_utils.get_vision_client", return_value=client):
+        assert annotate_pdf_inline(b"%PDF-1.4") is None
@@ -0,0 +1,59 @@
+# app/user_profile_builder.py
+
+import uuid
+from typing import Any
+
+from app.data_model import UserProfile
+
+# Free-text biological sex -> internal gender value
+_GENDER_MAP = {
+    "f": "female", "female": "female", "woman": "female", "girl": "female",
+    "m": "male", "male": "male", "man": "male", "boy": "male",
+    "other": "other", "non-binary": "other", "nonbinary": "other",
+}
+
+# Entries in medical_conditions that are really medications
+_OTC_MEDS = frozenset({"aspirin", "ibuprofen", "paracetamol", "acetaminophen"})
+
+DEFAULT_AGE = 35
+
+
+def build_user_profile(user_input: Any) -> UserProfile:
+    """
+    Normalize a frontend payload (app.api.FrontendUserInput) into the internal UserProfile:
+      - flexible biological sex -> gender
+      - default age when missing
+      - pregnancy merged into lifestyle
+      - OTC medications split out of medical_conditions
+    """
+    gender_raw = (user_input.biological_sex or "unspecified").strip().lower()
+    gender = _GENDER_MAP.get(gender_raw, "unspecified")
+
+    age = user_input.age or DEFAULT_AGE
+
+    lifestyle = user_input.lifestyle or {}
+    if user_input.pregnancy:
+        lifestyle["pregnancy"] = user_input.pregnancy.lower()
+
+    conditions = []
+    medications = []
+    for item in user_input.medical_conditions or []:
+        if item.lower() in _OTC_MEDS:
+            medications.append(item)
+        else:
+            conditions.append(item)
+
+    return UserProfile(
+        user_id=str(uuid.uuid4()),
+        age=age,
+        gender=gender,
+        symptoms=[],
+        lifestyle=lifestyle,
+        medical_conditions=conditions,
+        medical_history={},
+        medications=medications,
+        goals=user_input.health_priorities or [],
+        blood_tests=[],  # map processed_blood_data into BloodTestResult later if/when needed
+        wearable_data=None,
+        feedback=None,
+    )
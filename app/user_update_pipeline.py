@@ -3,7 +3,7 @@ from pathlib import Path
 
 from typing import Tuple, List
 from app.data_model import UserProfile
-from app.data_storage import load_all_users, save_user
+from app.data_storage import load_all_users, save_all_users
 from app.cluster_engine import ClusterEngine
 from app.cluster_logger import log_cluster_assignments, log_protocol_differences
 
@@ -11,19 +11,16 @@ def add_user_and_recluster(new_user_data: UserProfile) -> Tuple[UserProfile, Clu
     all_users: List[UserProfile] = load_all_users()
     all_users.append(new_user_data)
 
-    old_engine = ClusterEngine(n_clusters=3)
-    old_engine.fit(all_users)
-    old_protocols = old_engine.protocols
-
+    # Saved protocols (loaded on init) are the "old" side of the diff; fitting a
+    # second engine on the same users just to get them produced an empty diff.
     cluster_engine = ClusterEngine(n_clusters=3)
-    cluster_engine.fit(all_users)
-    new_protocols = cluster_engine.protocols
-
-    for user in all_users:
-        user.cluster_id = cluster_engine.assign_cluster(user)
-        save_user(user)
+    old_protocols = cluster_engine.protocols
+    new_protocols = cluster_engine.fit(all_users)
 
-    new_user_data.cluster_id = cluster_engine.assign_cluster(new_user_data)
+    # new_user_data is the last training user, so this labels it too
+    for user, cluster in zip(all_users, cluster_engine.labels):
+        user.cluster_id = cluster
+    save_all_users(all_users)
 
     # âœ… Logging:
     log_cluster_assignments(all_users)
@@ -0,0 +1,73 @@
+# app/vision_utils.py
+
+import functools
+import os
+from typing import BinaryIO, List, Optional
+
+import grpc
+import orjson
+from google.api_core.exceptions import GoogleAPICallError
+from google.cloud import vision
+from google.oauth2 import service_account
+
+
+@functools.lru_cache(maxsize=1)
+def get_vision_client() -> vision.ImageAnnotatorClient:
+    """
+    Shared Google Vision client, built once per process on first use.
+    Its gRPC channel is thread-safe and multiplexed, so every request reuses it.
+    """
+    creds_json = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+    if creds_json:
+        creds_info = orjson.loads(creds_json)
+        credentials = service_account.Credentials.from_service_account_info(creds_info)
+    else:
+        credentials = None  # fall back to Application Default Credentials
+    return vision.ImageAnnotatorClient(credentials=credentials)
+
+
+def warm_vision_client(timeout: float = 5.0) -> None:
+    """Build the client and open its channel so the first OCR request skips the TLS handshake."""
+    client = get_vision_client()
+    grpc.channel_ready_future(client.transport.grpc_channel).result(timeout=timeout)
+
+
+# batch_annotate_files only annotates the first 5 pages of an inline PDF
+VISION_FILE_MAX_PAGES = 5
+
+
+def annotate_pdf_inline(content: bytes) -> Optional[List[str]]:
+    """
+    OCR a short PDF directly with batch_annotate_files, skipping rasterisation.
+    Callers check the page count first (see pdf_page_count). Returns one text
+    per page, or None when Vision rejects the file so the caller can render
+    pages instead.
+    """
+    request = {
+        "input_config": {"content": content, "mime_type": "application/pdf"},
+        "features": [{"type_": vision.Feature.Type.DOCUMENT_TEXT_DETECTION}],
+    }
+    try:
+        response = get_vision_client().batch_annotate_files(requests=[request])
+    except GoogleAPICallError:
+        return None
+    file_response = response.responses[0]
+    if file_response.error.message or file_response.total_pages > VISION_FILE_MAX_PAGES:
+        return None
+    return [page.full_text_annotation.text for page in file_response.responses]
+
+
+def pdf_page_count(upload: BinaryIO) -> Optional[int]:
+    """Page count from the PDF's page tree, without parsing the pages; None if unreadable."""
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    upload.seek(0)
+    try:
+        document = PDFDocument(PDFParser(upload))
+        return int(resolve1(resolve1(document.catalog["Pages"])["Count"]))
+    except Exception:
+        return None
+    finally:
+        upload.seek(0)